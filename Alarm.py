@@ -1,6 +1,7 @@
 from gpiozero import PWMOutputDevice, Button
-from time import sleep
 import os
+import time
+import threading
 from datetime import datetime
 
 BUZZER_PIN = 23
@@ -14,49 +15,77 @@ ALARM_PATTERN = [
     (0.1, 0.6)
 ]
 
-def run_active_alarm(aware=True):
+def run_active_alarm(aware=True, max_duration=None):
+    """Sound the alarm pattern until the stop button is pressed.
+
+    The button's when_pressed callback silences the buzzer itself, so the
+    press takes effect immediately instead of at the next pattern step.
+    Returns the monotonic time the buzzer was silenced by the button, or
+    None if the alarm ended any other way.
+    """
     if aware:
         if os.path.exists("skipnextalarm"):
             os.remove("skipnextalarm")
-            return
+            return None
 
     buzzer = PWMOutputDevice(BUZZER_PIN, frequency=2000)
     stop_button = Button(BUTTON_PIN)
-    alarm_running = True
+    stopped = threading.Event()
+    buzzer_lock = threading.Lock()
+    stop_times = {}
+
+    def on_press():
+        pressed = time.monotonic()
+        with buzzer_lock:
+            stopped.set()
+            buzzer.off()
+        stop_times["pressed"] = pressed
+        stop_times["silenced"] = time.monotonic()
+
+    stop_button.when_pressed = on_press
+    if stop_button.is_pressed:
+        on_press()
+    deadline = time.monotonic() + max_duration if max_duration else None
 
     try:
-        while alarm_running:
-            if stop_button.is_pressed:
-                print("\nButton pressed. Ending alarm.")
-                alarm_running = False
+        while not stopped.is_set():
+            if deadline and time.monotonic() >= deadline:
+                print("\nAlarm reached its maximum duration.")
                 break
 
             for on_time, off_time in ALARM_PATTERN:
-                if stop_button.is_pressed:
-                    alarm_running = False
-                    break
-                
                 actual_on = on_time / SPEED_MULTIPLIER
                 actual_off = off_time / SPEED_MULTIPLIER
 
                 if actual_on > 0:
-                    buzzer.value = VOLUME
-                    sleep(actual_on)
-                
+                    with buzzer_lock:
+                        if stopped.is_set():
+                            break
+                        buzzer.value = VOLUME
+                    if stopped.wait(actual_on):
+                        break
+
                 buzzer.off()
-                
-                if stop_button.is_pressed:
-                    alarm_running = False
+
+                if stopped.wait(actual_off):
                     break
-                    
-                sleep(actual_off)
 
     except KeyboardInterrupt:
         print("\nAlarm stopped via Keyboard.")
-    
+
     finally:
+        stop_button.when_pressed = None
         buzzer.off()
+        stop_button.close()
+        buzzer.close()
         print("System cleanup complete.")
 
+    if "silenced" not in stop_times:
+        return None
+
+    latency = (stop_times["silenced"] - stop_times["pressed"]) * 1000
+    print(f"\nButton pressed at {datetime.now().strftime('%H:%M:%S')}. Alarm silenced in {latency:.2f} ms.")
+    return stop_times["silenced"]
+
 if __name__ == "__main__":
-    run_active_alarm()
\ No newline at end of file
+    run_active_alarm()
@@ -0,0 +1,214 @@
+#!/usr/bin/python3
+
+import time
+import asyncio
+import concurrent.futures
+import threading
+from collections import OrderedDict
+
+ACTION_WORKERS = 3
+DEFAULT_TIMEOUT = 120.0
+METRICS_TIMEOUT = 5.0
+
+def empty_metric():
+    return {
+        "submitted": 0,
+        "coalesced": 0,
+        "completed": 0,
+        "failed": 0,
+        "timed_out": 0,
+        "wait_total": 0.0,
+        "wait_max": 0.0,
+        "run_total": 0.0,
+        "run_max": 0.0
+    }
+
+class ActionScheduler:
+    """Fixed worker pool for night-time actions.
+
+    Requests are coalesced per action type (the latest request wins), and
+    one action type never runs twice at once. Actions run on the worker
+    threads themselves. A Python thread can't be interrupted, so an
+    action that overruns its timeout keeps its worker until it returns
+    and is then counted as timed out.
+    """
+
+    def __init__(self, workers=ACTION_WORKERS, default_timeout=DEFAULT_TIMEOUT):
+        self._condition = threading.Condition()
+        self._pending = OrderedDict()
+        self._running = set()
+        self._metrics = {}
+        self.default_timeout = default_timeout
+
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"action-worker-{i}", daemon=True).start()
+
+    def _metric(self, action_type):
+        return self._metrics.setdefault(action_type, empty_metric())
+
+    def submit(self, action_type, target, args=(), kwargs=None, timeout=None):
+        with self._condition:
+            metric = self._metric(action_type)
+            metric["submitted"] += 1
+            if action_type in self._pending:
+                metric["coalesced"] += 1
+                del self._pending[action_type]
+
+            self._pending[action_type] = (target, args, kwargs or {}, timeout or self.default_timeout, time.monotonic())
+            self._condition.notify()
+
+    def _next_action(self):
+        for action_type in self._pending:
+            if action_type not in self._running:
+                return action_type
+        return None
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._next_action() is not None)
+                action_type = self._next_action()
+                target, args, kwargs, timeout, enqueued = self._pending.pop(action_type)
+                self._running.add(action_type)
+
+            started = time.monotonic()
+            outcome = "completed"
+            try:
+                target(*args, **kwargs)
+            except Exception as e:
+                outcome = "failed"
+                print(f"Action {action_type} failed: {e}")
+
+            wait_time = started - enqueued
+            run_time = time.monotonic() - started
+            if outcome == "completed" and run_time > timeout:
+                outcome = "timed_out"
+
+            with self._condition:
+                self._running.discard(action_type)
+                metric = self._metric(action_type)
+                metric[outcome] += 1
+                metric["wait_total"] += wait_time
+                metric["wait_max"] = max(metric["wait_max"], wait_time)
+                metric["run_total"] += run_time
+                metric["run_max"] = max(metric["run_max"], run_time)
+                self._condition.notify_all()
+
+            if outcome == "timed_out":
+                print(f"Action {action_type} overran its {timeout:.1f}s timeout, taking {run_time:.2f}s")
+            elif outcome == "completed":
+                print(f"Action {action_type} finished in {run_time:.2f}s after waiting {wait_time:.2f}s")
+
+    def metrics(self):
+        with self._condition:
+            return {
+                action_type: dict(metric, queued=action_type in self._pending, running=action_type in self._running)
+                for action_type, metric in self._metrics.items()
+            }
+
+class AsyncActionScheduler:
+    """ActionScheduler's submit() for an asyncio loop.
+
+    The same rules apply: requests coalesce per action type, one type
+    never runs twice at once, and an overrun is reported at its timeout
+    but keeps its type blocked until it really finishes. Each run is a
+    task awaiting the blocking action in executor. Every type runs at
+    most once at a time, so the executor needs one worker per action
+    type to never queue; in case it does, the wait is measured up to the
+    moment the action starts on an executor thread. submit() and
+    metrics() may be called from any thread; state is only touched on
+    the loop.
+    """
+
+    def __init__(self, loop, executor, default_timeout=DEFAULT_TIMEOUT):
+        self._loop = loop
+        self._executor = executor
+        self._pending = OrderedDict()
+        self._running = set()
+        self._tasks = set()
+        self._metrics = {}
+        self.default_timeout = default_timeout
+
+    def submit(self, action_type, target, args=(), kwargs=None, timeout=None):
+        request = (target, args, kwargs or {}, timeout or self.default_timeout, time.monotonic())
+        self._loop.call_soon_threadsafe(self._enqueue, action_type, request)
+
+    def _enqueue(self, action_type, request):
+        metric = self._metrics.setdefault(action_type, empty_metric())
+        metric["submitted"] += 1
+        if action_type in self._pending:
+            metric["coalesced"] += 1
+            del self._pending[action_type]
+
+        self._pending[action_type] = request
+        if action_type not in self._running:
+            self._start(action_type)
+
+    def _start(self, action_type):
+        self._running.add(action_type)
+        task = self._loop.create_task(self._run(action_type, *self._pending.pop(action_type)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, action_type, target, args, kwargs, timeout, enqueued):
+        metric = self._metrics[action_type]
+        started = None
+
+        def run():
+            nonlocal started
+            started = time.monotonic()
+            target(*args, **kwargs)
+
+        future = self._loop.run_in_executor(self._executor, run)
+
+        outcome = "completed"
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            outcome = "timed_out"
+        except Exception as e:
+            outcome = "failed"
+            print(f"Action {action_type} failed: {e}")
+        metric[outcome] += 1
+
+        if started is None:
+            # Timed out while still queued in the executor.
+            started = time.monotonic()
+        wait_time = started - enqueued
+        run_time = time.monotonic() - started
+        metric["wait_total"] += wait_time
+        metric["wait_max"] = max(metric["wait_max"], wait_time)
+        metric["run_total"] += run_time
+        metric["run_max"] = max(metric["run_max"], run_time)
+
+        if outcome == "timed_out":
+            print(f"Action {action_type} timed out after {timeout:.1f}s")
+            try:
+                await future
+            except Exception as e:
+                print(f"Action {action_type} failed: {e}")
+        elif outcome == "completed":
+            print(f"Action {action_type} finished in {run_time:.2f}s after waiting {wait_time:.2f}s")
+
+        self._running.discard(action_type)
+        if action_type in self._pending:
+            self._start(action_type)
+
+    def metrics(self):
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        # Once the loop has stopped nothing else touches the state.
+        if on_loop or not self._loop.is_running():
+            return self._snapshot()
+
+        future = concurrent.futures.Future()
+        self._loop.call_soon_threadsafe(lambda: future.set_result(self._snapshot()))
+        return future.result(timeout=METRICS_TIMEOUT)
+
+    def _snapshot(self):
+        return {
+            action_type: dict(metric, queued=action_type in self._pending, running=action_type in self._running)
+            for action_type, metric in self._metrics.items()
+        }
@@ -0,0 +1,106 @@
+#!/usr/bin/python3
+
+import os
+import json
+import threading
+from datetime import datetime, timedelta
+
+SCHEDULE_PATH = "Data/alarm_schedule.json"
+MISSED_GRACE = timedelta(minutes=10)
+MAX_WAIT = 60.0
+
+class AlarmScheduler:
+    """In-process one-shot timers for the alarm and fade, kept in a persisted schedule file.
+
+    schedule() and cancel() only update a dict and wake the timer thread,
+    so moving the alarm costs microseconds. The schedule file is written
+    by the timer thread. Timers reloaded from it after a restart fire
+    immediately if they were missed by less than MISSED_GRACE.
+    """
+
+    def __init__(self, actions, schedule_path=SCHEDULE_PATH):
+        self._condition = threading.Condition()
+        self._timers = {}
+        self._dirty = False
+        self.actions = actions
+        self.schedule_path = schedule_path
+
+        self._load()
+        threading.Thread(target=self._run, name="alarm-scheduler", daemon=True).start()
+
+    def _load(self):
+        if not self.schedule_path or not os.path.isfile(self.schedule_path):
+            return
+
+        try:
+            with open(self.schedule_path) as f:
+                saved = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return
+
+        now = datetime.now()
+        for name, when in saved.items():
+            when = datetime.strptime(when, "%Y-%m-%d %H:%M:%S")
+            if name in self.actions and when > now - MISSED_GRACE:
+                self._timers[name] = when
+
+    def _save(self, timers):
+        os.makedirs(os.path.dirname(self.schedule_path), exist_ok=True)
+        temp_path = self.schedule_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({name: when.strftime("%Y-%m-%d %H:%M:%S") for name, when in timers.items()}, f, indent=4)
+        os.replace(temp_path, self.schedule_path)
+
+    def schedule(self, name, when):
+        if name not in self.actions:
+            raise KeyError(f"No action registered for timer {name}")
+
+        with self._condition:
+            self._timers[name] = when
+            self._dirty = True
+            self._condition.notify()
+
+    def cancel(self, name):
+        with self._condition:
+            if self._timers.pop(name, None) is not None:
+                self._dirty = True
+                self._condition.notify()
+
+    def next_fire(self, name):
+        with self._condition:
+            return self._timers.get(name)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                now = datetime.now()
+                due = [name for name, when in self._timers.items() if when <= now]
+                for name in due:
+                    del self._timers[name]
+                    self._dirty = True
+
+                timers = dict(self._timers) if self._dirty else None
+                self._dirty = False
+
+                if not due and timers is None:
+                    wait = MAX_WAIT
+                    if self._timers:
+                        wait = min(MAX_WAIT, max(0.0, (min(self._timers.values()) - now).total_seconds()))
+                    self._condition.wait(timeout=wait)
+                    continue
+
+            if timers is not None and self.schedule_path:
+                try:
+                    self._save(timers)
+                except OSError as e:
+                    print(f"Error saving alarm schedule: {e}")
+
+            for name in due:
+                print(f"Firing {name} at {datetime.now().strftime('%H:%M:%S')}")
+                threading.Thread(target=self._fire, args=(name,), name=f"timer-{name}", daemon=True).start()
+
+    def _fire(self, name):
+        try:
+            self.actions[name]()
+        except Exception as e:
+            print(f"Timer action {name} failed: {e}")
@@ -0,0 +1,42 @@
+#!/usr/bin/python3
+
+import time
+import random
+import statistics
+import threading
+from gpiozero import Device
+from gpiozero.pins.mock import MockFactory, MockPWMPin
+
+import Alarm
+
+PRESSES = 50
+
+def press_to_silence(factory):
+    """Press the mock button at a random point in the pattern and return the latency in seconds."""
+    result = {}
+    alarm = threading.Thread(target=lambda: result.update(silenced=Alarm.run_active_alarm(aware=False)))
+    alarm.start()
+
+    time.sleep(random.uniform(0.05, 1.0))
+    button = factory.pin(Alarm.BUTTON_PIN)
+    pressed = time.monotonic()
+    button.drive_low()
+    alarm.join()
+    button.drive_high()
+
+    if factory.pin(Alarm.BUZZER_PIN).state != 0:
+        raise RuntimeError("Buzzer still on after the button was pressed")
+    return result["silenced"] - pressed
+
+def run():
+    Device.pin_factory = MockFactory(pin_class=MockPWMPin)
+    latencies = sorted(press_to_silence(Device.pin_factory) for _ in range(PRESSES))
+
+    print(f"Press-to-silence over {PRESSES} presses (mock pins):")
+    print(f"  median {statistics.median(latencies) * 1000:8.3f} ms")
+    print(f"  p95    {latencies[int(0.95 * (PRESSES - 1))] * 1000:8.3f} ms")
+    print(f"  max    {latencies[-1] * 1000:8.3f} ms")
+    print(f"Worst case with polling was one pattern step: {max(max(step) for step in Alarm.ALARM_PATTERN) / Alarm.SPEED_MULTIPLIER * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    run()
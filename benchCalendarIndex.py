@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+
+import time
+import datetime
+import tempfile
+import os
+from ics import Calendar
+
+import calendarStandIn as stand_in
+from getCalendarData import IcsIndex, fetch_university_events
+
+DAYS = 365
+EVENTS_PER_DAY = 14
+LOOKUPS = 50
+
+def scan_lookup(cal_data, date):
+    """The previous behaviour: parse the whole feed and scan every event for one day."""
+    c = Calendar(cal_data)
+    return [event for event in list(c.events) if event.begin.date() == date]
+
+def run():
+    start_date = datetime.date.today()
+    ics = stand_in.make_synthetic_ics(start_date, DAYS, EVENTS_PER_DAY)
+    server, url = stand_in.start_stand_in(ics, port=0)
+    lookup_dates = [start_date + datetime.timedelta(days=i * 7 % DAYS) for i in range(LOOKUPS)]
+
+    print(f"Synthetic feed: {DAYS * EVENTS_PER_DAY} events, {len(ics) / 1024:.0f} KB")
+
+    try:
+        start = time.perf_counter()
+        scanned = scan_lookup(ics, lookup_dates[0])
+        scan_time = time.perf_counter() - start
+        print(f"Parse + scan per lookup:      {scan_time * 1000:9.1f} ms ({len(scanned)} events)")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            index = IcsIndex(os.path.join(tmp, "ics_index.json"))
+
+            start = time.perf_counter()
+            index.update(url)
+            print(f"Index build (fetch + parse):  {(time.perf_counter() - start) * 1000:9.1f} ms")
+
+            start = time.perf_counter()
+            for date in lookup_dates:
+                index.events_for(date)
+            lookup_time = (time.perf_counter() - start) / LOOKUPS
+            print(f"Indexed lookup:               {lookup_time * 1000:9.3f} ms")
+
+            start = time.perf_counter()
+            events = fetch_university_events(lookup_dates[0], url=url, index=index)
+            print(f"Unchanged feed (304) + lookup:{(time.perf_counter() - start) * 1000:9.1f} ms ({len(events)} events)")
+
+            start = time.perf_counter()
+            reloaded = IcsIndex(index.index_path)
+            reloaded.events_for(lookup_dates[0])
+            print(f"Index reload from disk:       {(time.perf_counter() - start) * 1000:9.1f} ms")
+
+        print(f"Speedup per lookup: {scan_time / lookup_time:,.0f}x")
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,220 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder
+
+import processData as data_processor
+import formatData as format_data
+import liveClassify as classifier
+from sensorStandIn import synthetic_night, make_packets
+
+RESULTS_PATH = "Data/bench_hotpaths.json"
+BASELINE_PATH = "Data/bench_hotpaths_baseline.json"
+SAMPLE_RATE = 100
+WINDOW_SIZE = 30
+BATCH_PACKETS = 50
+SAMPLES_PER_PACKET = 12
+HISTORY_ROWS = 13
+WARMUP = 5
+REPEATS = 200
+REGRESSION_THRESHOLD = 1.25
+SEED = 0
+
+FEATURES = [
+    'variance', 'entropy', 'power', 'movement', 'breathrate', 'heartrate', 'heart_coherence', 'breath_coherence',
+    'rolling_variance', 'rolling_entropy', 'rolling_power', 'rolling_movement', 'rolling_breathrate',
+    'rolling_heartrate', 'rolling_heart_coherence', 'rolling_breath_coherence',
+    'heartrate_change', 'breathrate_change', 'movement_change'
+]
+
+# Mostly inBed/Asleep so the fixture cascade usually runs all three models, like a real night.
+FIXTURE_LABELS = {
+    'in_bed': (['inBed', 'notInBed'], [0.9, 0.1]),
+    'asleep': (['Asleep', 'Awake'], [0.9, 0.1]),
+    'state': (['Core Sleep', 'Deep Sleep', 'REM Sleep'], [0.5, 0.25, 0.25]),
+}
+
+def fixture_models(rows=2000, seed=SEED):
+    """Small deterministic models with the live feature set, so inference cost doesn't depend on the registry."""
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(rows, len(FEATURES))), columns=FEATURES)
+
+    models = {}
+    for name, (labels, weights) in FIXTURE_LABELS.items():
+        y = rng.choice(labels, size=rows, p=weights)
+        encoder = LabelEncoder().fit(y)
+        model = RandomForestClassifier(n_estimators=50, max_depth=16, random_state=seed, n_jobs=1)
+        model.fit(X, encoder.transform(y))
+        models[name] = (model, encoder)
+
+    return classifier.ModelSet("fixture", models)
+
+def fixture_inputs(seed=SEED):
+    start = datetime(2025, 1, 1, 23, 0, 0)
+    times, voltages = synthetic_night(start, hours=0.5, seed=seed)
+
+    # process_batch input: BATCH_PACKETS packets, every sample stamped with its packet's arrival time.
+    packets = make_packets(voltages[:BATCH_PACKETS * SAMPLES_PER_PACKET], SAMPLES_PER_PACKET)
+    raw_batch = []
+    for i, packet in enumerate(packets):
+        arrival = times[(i + 1) * SAMPLES_PER_PACKET - 1]
+        raw_batch.extend((arrival, int(value)) for value in np.frombuffer(packet, dtype='<i2'))
+
+    # A full 30 s window from the quiet part of the night, as classify() sees it.
+    offset = 25 * 60 * SAMPLE_RATE
+    window = slice(offset, offset + WINDOW_SIZE * SAMPLE_RATE)
+    time_array = pd.to_datetime(times[window], unit='s').values
+    voltage_array = voltages[window]
+    first_ts = pd.Timestamp(time_array[0])
+
+    cleaned = format_data.remove_drift(format_data.clean_signal(voltage_array), SAMPLE_RATE)
+
+    history = []
+    for i in range(HISTORY_ROWS):
+        step = slice(offset + i * 5 * SAMPLE_RATE, offset + (i * 5 + WINDOW_SIZE) * SAMPLE_RATE)
+        step_times = pd.to_datetime(times[step], unit='s').values
+        history.append(format_data.process_window(step_times, voltages[step], pd.Timestamp(step_times[0]), WINDOW_SIZE))
+    history = pd.DataFrame(history)
+
+    return {
+        "raw_batch": raw_batch,
+        "time_array": time_array,
+        "voltage_array": voltage_array,
+        "first_ts": first_ts,
+        "cleaned": cleaned,
+        "history": history,
+        "snippet": format_data.add_history_features(history.copy()),
+    }
+
+def benchmarks(inputs, models):
+    return {
+        "process_batch": lambda: data_processor.process_batch(inputs["raw_batch"]),
+        "process_window": lambda: format_data.process_window(inputs["time_array"], inputs["voltage_array"], inputs["first_ts"], WINDOW_SIZE),
+        "remove_drift": lambda: format_data.remove_drift(format_data.clean_signal(inputs["voltage_array"]), SAMPLE_RATE),
+        "get_breathrate_stats": lambda: format_data.get_breathrate_stats(inputs["cleaned"], SAMPLE_RATE),
+        "get_heartbeat_stats": lambda: format_data.get_heartbeat_stats(inputs["cleaned"], SAMPLE_RATE),
+        "calculate_spectral_entropy": lambda: format_data.calculate_spectral_entropy(inputs["cleaned"]),
+        # add_history_features adds columns in place, so every call gets a fresh copy.
+        "add_history_features": lambda: format_data.add_history_features(inputs["history"].copy()),
+        "classify_snippet": lambda: classifier.classify_snippet(inputs["snippet"], models),
+    }
+
+def measure(func, repeats=REPEATS, warmup=WARMUP):
+    for _ in range(warmup):
+        func()
+
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter_ns()
+        func()
+        timings[i] = time.perf_counter_ns() - start
+    timings /= 1e6
+
+    # Allocation pass kept separate so tracing doesn't inflate the timings.
+    allocation_repeats = max(1, repeats // 10)
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(allocation_repeats):
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - base)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "calls": repeats,
+        "mean_ms": round(float(timings.mean()), 4),
+        "p50_ms": round(float(np.percentile(timings, 50)), 4),
+        "p90_ms": round(float(np.percentile(timings, 90)), 4),
+        "p99_ms": round(float(np.percentile(timings, 99)), 4),
+        "max_ms": round(float(timings.max()), 4),
+        "peak_alloc_kb": round(float(np.median(peaks)) / 1024, 1),
+    }
+
+def run(repeats=REPEATS, only=None):
+    print("Building fixtures...")
+    models = fixture_models()
+    inputs = fixture_inputs()
+
+    results = {}
+    for name, func in benchmarks(inputs, models).items():
+        if only and name not in only:
+            continue
+        results[name] = measure(func, repeats)
+        r = results[name]
+        print(f"  {name:28s} p50 {r['p50_ms']:8.3f} ms  p90 {r['p90_ms']:8.3f} ms  p99 {r['p99_ms']:8.3f} ms  peak {r['peak_alloc_kb']:9.1f} KB")
+
+    return {
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "repeats": repeats,
+        "results": results,
+    }
+
+def compare(report, baseline, threshold=REGRESSION_THRESHOLD):
+    """Print p50 and peak-allocation ratios against the baseline; returns the names that regressed."""
+    regressions = []
+    print(f"Against baseline from {baseline['created']} ({baseline['machine']}, Python {baseline['python']}):")
+
+    for name, result in report["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"  {name:28s} (not in baseline)")
+            continue
+
+        time_ratio = result["p50_ms"] / base["p50_ms"] if base["p50_ms"] else 1.0
+        alloc_ratio = result["peak_alloc_kb"] / base["peak_alloc_kb"] if base["peak_alloc_kb"] else 1.0
+        regressed = time_ratio > threshold or alloc_ratio > threshold
+        if regressed:
+            regressions.append(name)
+
+        print(f"  {name:28s} time x{time_ratio:5.2f}  alloc x{alloc_ratio:5.2f}{'  REGRESSION' if regressed else ''}")
+
+    return regressions
+
+def save(report, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(report, f, indent=4)
+    os.replace(temp_path, path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the DSP and inference hot paths")
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--only", nargs="+", help="run only these benchmarks")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="slowdown ratio that counts as a regression")
+    args = parser.parse_args()
+
+    report = run(args.repeats, args.only)
+    save(report, args.output)
+
+    if args.save_baseline:
+        save(report, args.baseline)
+        print(f"Saved baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
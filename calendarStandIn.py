@@ -0,0 +1,102 @@
+#!/usr/bin/python3
+
+import sys
+import time
+import random
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+def make_synthetic_ics(start_date, days=365, events_per_day=8, seed=0):
+    rng = random.Random(seed)
+    lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//SleepAutomation//StandIn//EN"]
+
+    for day in range(days):
+        date = start_date + timedelta(days=day)
+        for i in range(events_per_day):
+            begin = datetime.combine(date, datetime.min.time()) + timedelta(hours=rng.randint(8, 18), minutes=rng.choice((0, 15, 30, 45)))
+            end = begin + timedelta(hours=1)
+            lines += [
+                "BEGIN:VEVENT",
+                f"UID:standin-{day}-{i}@sleepautomation",
+                f"DTSTAMP:{begin.strftime('%Y%m%dT%H%M%SZ')}",
+                f"DTSTART:{begin.strftime('%Y%m%dT%H%M%SZ')}",
+                f"DTEND:{end.strftime('%Y%m%dT%H%M%SZ')}",
+                f"SUMMARY:Lecture {i}",
+                f"LOCATION:Room {rng.randint(1, 40)}",
+                "DESCRIPTION:Synthetic event",
+                "END:VEVENT",
+            ]
+
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(lines) + "\r\n"
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        time.sleep(server.delay)
+
+        if random.random() < server.fail_rate:
+            self.send_error(503, "Stand-in failure")
+            return
+
+        body = server.ics.encode("utf-8")
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/calendar")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stand_in(ics, host=HOST, port=PORT, delay=0.0, fail_rate=0.0):
+    """Serve ics on a background thread; returns the server (call shutdown() to stop) and its URL."""
+    server = ThreadingHTTPServer((host, port), StandInHandler)
+    server.ics = ics
+    server.delay = delay
+    server.fail_rate = fail_rate
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/calendar.ics"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the university ICS feed")
+    parser.add_argument("--file", help="serve this ICS file instead of a synthetic calendar")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--events-per-day", type=int, default=8)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file) as f:
+            ics = f.read()
+    else:
+        ics = make_synthetic_ics(datetime.now().date(), args.days, args.events_per_day)
+
+    server, url = start_stand_in(ics, port=args.port, delay=args.delay, fail_rate=args.fail_rate)
+    print(f"Serving calendar on {url} (set UNI_CALENDAR_URL to use it)")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
@@ -2,6 +2,7 @@ import math
 import time
 import socket
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from requests import Session, RequestException
 
@@ -14,7 +15,7 @@ load_dotenv()
 
 PI_IP = "192.168.1.39"
 
-BASE_URL = "http://localhost:8123" if running_on_pi() else f"http://{PI_IP}:8123"
+BASE_URL = os.environ.get("HA_URL") or ("http://localhost:8123" if running_on_pi() else f"http://{PI_IP}:8123")
 HASS_URL = f"{BASE_URL}/api/services"
 
 TOKEN = os.environ.get("HA_AUTH_TOKEN")
@@ -23,6 +24,11 @@ if not TOKEN:
 
 ENTITIES = ["light.bed_light", "light.desk_overhead_light", "light.main_bedroom_light"]
 
+TRANSITION_SEGMENT = 60.0      # seconds per Home Assistant transition on long fades
+MIN_SEGMENTS = 8               # keeps short fades close to the cosine curve
+LATENCY_HEADROOM = 4.0         # a step is never shorter than this many request latencies
+MIN_STEP = 0.25
+
 headers = {
     "Authorization": f"Bearer {TOKEN}",
     "Content-Type": "application/json",
@@ -30,11 +36,13 @@ headers = {
 
 session = Session()
 
-def set_brightness(level, retries=3, entity_id=ENTITIES):
+def set_brightness(level, retries=3, entity_id=ENTITIES, transition=None):
     """Set brightness with clamping + basic retry logic."""
     level = max(0, min(255, int(level)))  # safe clamp
 
     payload = {"entity_id": entity_id, "brightness": level}
+    if transition:
+        payload["transition"] = round(transition, 2)
     for attempt in range(1, retries + 1):
         try:
             r = session.post(
@@ -51,26 +59,54 @@ def set_brightness(level, retries=3, entity_id=ENTITIES):
                 raise
             time.sleep(0.5)
 
-def fade_lights(duration=1800, steps=255, entities=["light.bed_light", "light.desk_overhead_light", "light.main_bedroom_light"], aware=True, alarm_mode=False, max_brightness=78):
+def set_brightness_all(executor, level, entities, transition=None):
+    """One request per entity in parallel; returns the slowest request's latency."""
+    def timed(entity):
+        start = time.monotonic()
+        set_brightness(level, entity_id=entity, transition=transition)
+        return time.monotonic() - start
+
+    return max(executor.map(timed, entities))
+
+def brightness_at(x, max_brightness):
+    return max_brightness * (1 - math.cos(x * math.pi)) / 2
+
+def fade_lights(duration=1800, steps=255, entities=["light.bed_light", "light.desk_overhead_light", "light.main_bedroom_light"], aware=True, alarm_mode=False, max_brightness=78, use_transition=True):
     if aware:
         if os.path.exists("skipnextfadelights"):
             os.remove("skipnextfadelights")
             return
-        
+
+    # With transitions Home Assistant interpolates each segment, so long fades
+    # need far fewer requests; the cosine curve is followed segment by segment.
     step_time = duration / steps
+    if use_transition:
+        step_time = max(step_time, min(TRANSITION_SEGMENT, duration / MIN_SEGMENTS))
 
+    latency = 0.0
     start = time.monotonic()
 
-    for i in range(steps + 1):
-        x = i / steps
-        brightness = max_brightness * (1 - math.cos(x * math.pi)) / 2 
-        
-        set_brightness(brightness, entity_id=entities)
+    with ThreadPoolExecutor(max_workers=len(entities)) as executor:
+        while True:
+            elapsed = time.monotonic() - start
+            if elapsed >= duration:
+                break
+
+            step = max(step_time, LATENCY_HEADROOM * latency, MIN_STEP)
+            target = min(elapsed + step, duration)
+
+            if use_transition:
+                request_latency = set_brightness_all(executor, brightness_at(target / duration, max_brightness), entities, transition=target - elapsed)
+            else:
+                request_latency = set_brightness_all(executor, brightness_at(elapsed / duration, max_brightness), entities)
+
+            latency = request_latency if latency == 0.0 else 0.8 * latency + 0.2 * request_latency
+
+            sleep_for = start + target - time.monotonic()
+            if sleep_for > 0:
+                time.sleep(sleep_for)
 
-        next_target = start + (i + 1) * step_time
-        sleep_for = next_target - time.monotonic()
-        if sleep_for > 0:
-            time.sleep(sleep_for)
+        set_brightness_all(executor, max_brightness, entities)
 
     if alarm_mode:
         run_active_alarm(aware=aware)
@@ -285,6 +285,30 @@ def process_window(time_array, voltage_array, start_time, window_size):
         'breath_coherence': breath_coherence
     }
 
+def format_raw_night(df_path, night_id):
+    df = pd.read_csv(df_path, parse_dates=['datetime'])
+    df = df.sort_values('datetime').reset_index(drop=True)
+    
+    time_array = df['datetime'].values
+    voltage_array = df['voltage'].values
+
+    first_ts = df['datetime'].iloc[0]
+    last_ts = df['datetime'].iloc[-1]
+
+    timestamp_list = pd.date_range(start=first_ts, end=last_ts, freq=f'{STEP_SIZE}s')
+
+    formatted_data = Parallel(n_jobs=-1)(
+        delayed(process_window)(time_array, voltage_array, ts, WINDOW_SIZE) 
+        for ts in tqdm(timestamp_list, desc=f"Processing Night {night_id}", leave=False)
+    )
+    formatted_data = [data for data in formatted_data if data is not None]
+
+    data = pd.DataFrame(formatted_data)
+    data = data.sort_values(by='timestamp')
+    data = data.reset_index(drop=True)
+
+    return add_history_features(data)
+
 def run(reformat=REFORMAT):
     print(f"Starting data formatting..., reformat={reformat}")
     dataframes = sorted(glob.glob(os.path.join('Data', '*', 'raw_data-*.csv')))
@@ -297,29 +321,9 @@ def run(reformat=REFORMAT):
             print(f"The file formatted_data-{night_id}.csv exists.")
             continue
 
-        df = pd.read_csv(df_path, parse_dates=['datetime'])
-        df = df.sort_values('datetime').reset_index(drop=True)
-        
-        time_array = df['datetime'].values
-        voltage_array = df['voltage'].values
-
-        first_ts = df['datetime'].iloc[0]
-        last_ts = df['datetime'].iloc[-1]
-
-        timestamp_list = pd.date_range(start=first_ts, end=last_ts, freq=f'{STEP_SIZE}s')
-
-        formatted_data = Parallel(n_jobs=-1)(
-            delayed(process_window)(time_array, voltage_array, ts, WINDOW_SIZE) 
-            for ts in tqdm(timestamp_list, desc=f"Processing Night {night_id}", leave=False)
-        )
-        formatted_data = [data for data in formatted_data if data is not None]
-
-        data = pd.DataFrame(formatted_data)
-        data = data.sort_values(by='timestamp')
-        data = data.reset_index(drop=True)
+        data = format_raw_night(df_path, night_id)
 
         if data is not None:
-            data = add_history_features(data)
             data = assign_sleep_states(data, night_id)
             all_nights_data.append(data)
 
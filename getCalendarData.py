@@ -1,5 +1,10 @@
 import os
+import json
+import time
+import hashlib
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from ics import Calendar
 from icalendar import Calendar as icloudCal
 from dotenv import load_dotenv
@@ -13,56 +18,255 @@ PERSONAL_CALENDAR_URL = os.environ.get("PERSONAL_CALENDAR_URL")
 APPLE_ID = os.environ.get("APPLE_ID")
 APP_PASSWORD = os.environ.get("APP_PASSWORD")
 
-def get_calendar_data(date):
-    tomorrows_events = []
-
-    try:
-        with caldav.DAVClient(url=PERSONAL_CALENDAR_URL, username=APPLE_ID, password=APP_PASSWORD) as client:
-            my_principal = client.principal()
-
-            calendars = my_principal.calendars()
-            next_day = date + datetime.timedelta(days=1)
-            for calendar in calendars:
-                icloud_events = calendar.date_search(start=date, end=next_day, expand=True)
-                for icloud_event in icloud_events:
-                    event = icloudCal.from_ical(icloud_event.data).walk('vevent')[0]
-                    tomorrows_events.append({
-                        "title":event.get('summary', 'No Title'),
-                        "time":event.get('dtstart').dt.time(),
-                        "location":event.get('location', 'No Location'),
-                        "notes": event.get('description', 'No Notes')
-                    })
-        
-    except Exception as e:
-        print(f"Error connecting to iCloud: {e}")
-        exit(1)
-
-    try:
-        cal_data = requests.get(UNI_CALENDAR_URL).text
-        c = Calendar(cal_data)
-    except Exception as e:
-        print(f"Error downloading or parsing calendar: {e}")
-        exit()
-        
+SOURCE_TIMEOUT = 20
+CACHE_TTL = 30 * 60
+CACHE_PATH = "Data/calendar_cache.json"
+PREFETCH_HOUR = 18
+PREFETCH_INTERVAL = 30 * 60
+ICS_INDEX_PATH = "Data/ics_index.json"
+
+def as_date(date):
+    if isinstance(date, datetime.datetime):
+        return date.date()
+    return date
+
+def serialise_events(events):
+    return [dict(event, time=event["time"].strftime("%H:%M:%S")) for event in events]
+
+def deserialise_events(events):
+    return [dict(event, time=datetime.datetime.strptime(event["time"], "%H:%M:%S").time()) for event in events]
+
+def fetch_personal_events(date, url=None):
+    url = url or PERSONAL_CALENDAR_URL
+    if not url:
+        return []
+
+    events = []
+    with caldav.DAVClient(url=url, username=APPLE_ID, password=APP_PASSWORD, timeout=SOURCE_TIMEOUT) as client:
+        my_principal = client.principal()
+
+        calendars = my_principal.calendars()
+        next_day = date + datetime.timedelta(days=1)
+        for calendar in calendars:
+            icloud_events = calendar.date_search(start=date, end=next_day, expand=True)
+            for icloud_event in icloud_events:
+                event = icloudCal.from_ical(icloud_event.data).walk('vevent')[0]
+                events.append({
+                    "title":event.get('summary', 'No Title'),
+                    "time":event.get('dtstart').dt.time(),
+                    "location":event.get('location', 'No Location'),
+                    "notes": event.get('description', 'No Notes')
+                })
+
+    return events
+
+def index_ics(cal_data):
+    """Parse an ICS feed once into {iso date: [serialised events]}."""
+    c = Calendar(cal_data)
+
     all_events = list(c.events)
 
     if not all_events:
         print("No events found in the calendar.")
 
+    days = {}
     for event in all_events:
-        if event.begin.date() == date:
-            tomorrows_events.append({
-                "title":(event.name or "No Title"),
-                "time":event.begin.time(),
-                "location":(event.location or 'No Location'),
-                "notes": (event.description or 'No Notes')
-            })
+        days.setdefault(event.begin.date().isoformat(), []).append({
+            "title":(event.name or "No Title"),
+            "time":event.begin.time().strftime("%H:%M:%S"),
+            "location":(event.location or 'No Location'),
+            "notes": (event.description or 'No Notes')
+        })
+
+    return days
+
+class IcsIndex:
+    """Date -> events index of the university feed, persisted to disk and rebuilt only when the feed changes."""
+
+    def __init__(self, index_path=ICS_INDEX_PATH):
+        self._lock = threading.Lock()
+        self.index_path = index_path
+        self._index = {"url": None, "etag": None, "hash": None, "days": {}}
+
+        if index_path and os.path.isfile(index_path):
+            try:
+                with open(index_path) as f:
+                    self._index = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                pass
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self._index, f)
+        os.replace(temp_path, self.index_path)
+
+    def update(self, url):
+        with self._lock:
+            same_url = self._index["url"] == url
+            headers = {"If-None-Match": self._index["etag"]} if same_url and self._index["etag"] else {}
+
+        response = requests.get(url, headers=headers, timeout=SOURCE_TIMEOUT)
+        if response.status_code == 304:
+            return False
+        response.raise_for_status()
+
+        digest = hashlib.sha256(response.content).hexdigest()
+        with self._lock:
+            if same_url and digest == self._index["hash"]:
+                self._index["etag"] = response.headers.get("ETag")
+                return False
+
+        days = index_ics(response.text)
+
+        with self._lock:
+            self._index = {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "hash": digest,
+                "days": days
+            }
+            if self.index_path:
+                self._save()
+        return True
+
+    def events_for(self, date):
+        with self._lock:
+            return deserialise_events(self._index["days"].get(as_date(date).isoformat(), []))
+
+university_index = IcsIndex()
+
+def fetch_university_events(date, url=None, index=None):
+    url = url or UNI_CALENDAR_URL
+    if not url:
+        return []
 
-    return tomorrows_events
+    index = index or university_index
+    index.update(url)
+    return index.events_for(date)
+
+SOURCES = [fetch_personal_events, fetch_university_events]
+
+def get_calendar_data(date, sources=None):
+    sources = sources or SOURCES
+
+    with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+        futures = [executor.submit(source, date) for source in sources]
+        return [event for future in futures for event in future.result()]
+
+class CalendarService:
+    """Per-date event cache in front of the calendar sources.
+
+    Fresh entries are served from memory. Stale or missing ones are
+    refetched, blocking or in the background. Every successful fetch is
+    also written to disk, so a failed fetch (or a restart with no
+    network) falls back to the last known events for that date.
+    """
+
+    def __init__(self, sources=None, ttl=CACHE_TTL, cache_path=CACHE_PATH):
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._refreshing = set()
+        self.sources = sources
+        self.ttl = ttl
+        self.cache_path = cache_path
+        self._disk = self._load_disk()
+
+    def _load_disk(self):
+        if not self.cache_path or not os.path.isfile(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return {}
+
+    def _save_disk(self):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        temp_path = self.cache_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self._disk, f, indent=4)
+        os.replace(temp_path, self.cache_path)
+
+    def refresh(self, date):
+        key = as_date(date).isoformat()
+        events = get_calendar_data(date, self.sources)
+
+        with self._lock:
+            self._cache[key] = (time.monotonic(), events)
+            if self.cache_path:
+                self._disk[key] = {
+                    "fetched": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "events": serialise_events(events)
+                }
+                self._save_disk()
+
+        return events
+
+    def refresh_async(self, date):
+        key = as_date(date).isoformat()
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self.refresh(date)
+            except Exception as e:
+                print(f"Error refreshing calendar for {key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def cached_events(self, date):
+        key = as_date(date).isoformat()
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key][1]
+            if key in self._disk:
+                return deserialise_events(self._disk[key]["events"])
+        return None
+
+    def is_fresh(self, date):
+        with self._lock:
+            entry = self._cache.get(as_date(date).isoformat())
+        return entry is not None and time.monotonic() - entry[0] < self.ttl
+
+    def get_events(self, date, block=True):
+        """Events for date, or None if nothing is known and fetching failed or was not allowed."""
+        if self.is_fresh(date):
+            return self.cached_events(date)
+
+        if not block:
+            self.refresh_async(date)
+            return self.cached_events(date)
+
+        try:
+            return self.refresh(date)
+        except Exception as e:
+            print(f"Error fetching calendar, using cached events: {e}")
+            return self.cached_events(date)
+
+    def run_prefetcher(self, until=None):
+        print("Calendar prefetcher started")
+        while until is None or datetime.datetime.now() < until:
+            self.prefetch_once()
+            time.sleep(PREFETCH_INTERVAL)
+
+    def prefetch_once(self):
+        now = datetime.datetime.now()
+        if now.hour >= PREFETCH_HOUR or now.hour < 12:
+            next_morning = now.date() + datetime.timedelta(days=1) if now.hour >= 12 else now.date()
+            if not self.is_fresh(next_morning):
+                self.refresh_async(next_morning)
 
 if __name__ == "__main__":
     today = datetime.date.today()
     tomorrow = today + datetime.timedelta(days=1)
-    
+
     events = get_calendar_data(today)
-    print(f"Earliest Scheduled Event Tomorrow is at: {sorted(events, key=lambda x: x['time'])[0]['time']}")
\ No newline at end of file
+    print(f"Earliest Scheduled Event Tomorrow is at: {sorted(events, key=lambda x: x['time'])[0]['time']}")
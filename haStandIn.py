@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HOST = "127.0.0.1"
+PORT = 8123
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers light service calls like Home Assistant and records when each one arrived."""
+
+    def do_POST(self):
+        server = self.server
+        received = time.monotonic()
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(server.delay)
+
+        try:
+            payload = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            self.send_error(400, "Invalid JSON")
+            return
+
+        with server.lock:
+            server.calls.append({
+                "received": received,
+                "answered": time.monotonic(),
+                "service": self.path,
+                "entity_id": payload.get("entity_id"),
+                "brightness": payload.get("brightness"),
+                "transition": payload.get("transition")
+            })
+
+        body = b"[]"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stand_in(host=HOST, port=PORT, delay=0.0):
+    """Serve on a background thread; returns the server (its calls list holds the recorded requests) and its URL."""
+    server = ThreadingHTTPServer((host, port), StandInHandler)
+    server.delay = delay
+    server.calls = []
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def summarise(calls):
+    if not calls:
+        return "No calls received"
+
+    start = calls[0]["received"]
+    lines = [f"{len(calls)} calls over {calls[-1]['received'] - start:.1f}s"]
+    for call in calls:
+        lines.append(
+            f"  +{call['received'] - start:7.2f}s {call['entity_id']} "
+            f"brightness={call['brightness']} transition={call['transition']} "
+            f"({(call['answered'] - call['received']) * 1000:.0f} ms)"
+        )
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Home Assistant light API")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    server, url = start_stand_in(port=args.port, delay=args.delay)
+    print(f"Serving Home Assistant stand-in on {url} (set HA_URL to use it)")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(summarise(server.calls))
+        sys.exit(0)
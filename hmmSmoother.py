@@ -0,0 +1,131 @@
+#!/usr/bin/python3
+
+import os
+import csv
+import glob
+import math
+from datetime import datetime
+from collections import deque
+
+STATES = ['notInBed', 'Awake', 'Core Sleep', 'Deep Sleep', 'REM Sleep']
+SLEEP_STATES = ['Core Sleep', 'Deep Sleep', 'REM Sleep']
+TICK_SECONDS = 2.0
+FIXED_LAG = 30
+OBSERVATION_ACCURACY = 0.7
+PSEUDOCOUNT = 1.0
+NOT_IN_BED_PRIOR_MINUTES = 30
+DEFAULT_SELF_TRANSITION = 0.995
+
+def hypnogram_paths(data_path="Data"):
+    return sorted(glob.glob(os.path.join(data_path, '*', 'true_sleep_data-*.csv')))
+
+def read_hypnogram(csv_path):
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        rows = [
+            row for row in csv.DictReader(f)
+            if row.get('sleep_state') in STATES
+        ]
+
+    segments = []
+    for row in rows:
+        try:
+            start = datetime.strptime(f"{row['date']} {row['time']}", "%Y-%m-%d %H:%M:%S")
+            minutes = float(row['duration_minutes'])
+        except (KeyError, ValueError):
+            continue
+        segments.append((start, row['sleep_state'], minutes))
+
+    segments.sort()
+    return [(state, minutes) for _, state, minutes in segments]
+
+def learn_transitions(paths=None, tick_seconds=TICK_SECONDS):
+    """Per-tick transition log-probabilities from the watch hypnograms, with notInBed bracketing each night."""
+    if paths is None:
+        paths = hypnogram_paths()
+
+    n = len(STATES)
+    index = {state: i for i, state in enumerate(STATES)}
+    counts = [[PSEUDOCOUNT] * n for _ in range(n)]
+    nights = 0
+
+    for path in paths:
+        segments = read_hypnogram(path)
+        if not segments:
+            continue
+        nights += 1
+
+        sequence = [('notInBed', NOT_IN_BED_PRIOR_MINUTES)] + segments + [('notInBed', NOT_IN_BED_PRIOR_MINUTES)]
+        for i, (state, minutes) in enumerate(sequence):
+            ticks = max(1.0, minutes * 60 / tick_seconds)
+            counts[index[state]][index[state]] += ticks - 1
+            if i + 1 < len(sequence):
+                counts[index[state]][index[sequence[i + 1][0]]] += 1
+
+    if nights == 0:
+        off_diagonal = (1 - DEFAULT_SELF_TRANSITION) / (n - 1)
+        counts = [
+            [DEFAULT_SELF_TRANSITION if i == j else off_diagonal for j in range(n)]
+            for i in range(n)
+        ]
+
+    return [[math.log(c / sum(row)) for c in row] for row in counts]
+
+def default_emissions(accuracy=OBSERVATION_ACCURACY):
+    n = len(STATES)
+    miss = (1 - accuracy) / (n - 1)
+    return [[math.log(accuracy if i == j else miss) for j in range(n)] for i in range(n)]
+
+class OnlineViterbi:
+    """Fixed-lag Viterbi decoder: each update costs O(states^2) and returns the decision FIXED_LAG ticks back."""
+
+    def __init__(self, transition_log=None, emission_log=None, lag=FIXED_LAG):
+        self.transition_log = transition_log if transition_log is not None else learn_transitions()
+        self.emission_log = emission_log if emission_log is not None else default_emissions()
+        self.lag = lag
+        self.index = {state: i for i, state in enumerate(STATES)}
+        self.delta = [-math.log(len(STATES))] * len(STATES)
+        self.backpointers = deque(maxlen=lag)
+        self.timestamps = deque(maxlen=lag + 1)
+
+    def update(self, timestamp, observation):
+        n = len(STATES)
+        obs = self.index.get(observation)
+
+        new_delta = [0.0] * n
+        pointers = [0] * n
+        for j in range(n):
+            best_i = 0
+            best = self.delta[0] + self.transition_log[0][j]
+            for i in range(1, n):
+                score = self.delta[i] + self.transition_log[i][j]
+                if score > best:
+                    best, best_i = score, i
+            new_delta[j] = best + (self.emission_log[j][obs] if obs is not None else 0.0)
+            pointers[j] = best_i
+
+        # Keep scores near zero so long nights never underflow.
+        top = max(new_delta)
+        self.delta = [d - top for d in new_delta]
+        self.backpointers.append(pointers)
+        self.timestamps.append(timestamp)
+
+        if len(self.timestamps) <= self.lag:
+            return None
+
+        state = self.delta.index(0.0)
+        for pointers in reversed(self.backpointers):
+            state = pointers[state]
+
+        return self.timestamps[0], STATES[state]
+
+    def current_state(self):
+        return STATES[self.delta.index(max(self.delta))]
+
+    def snapshot(self):
+        # The transition and emission tables are rebuilt at start-up, so only the decoding state is kept.
+        return {"delta": list(self.delta), "backpointers": list(self.backpointers), "timestamps": list(self.timestamps)}
+
+    def restore(self, snapshot):
+        self.delta = list(snapshot["delta"])
+        self.backpointers = deque(snapshot["backpointers"], maxlen=self.lag)
+        self.timestamps = deque(snapshot["timestamps"], maxlen=self.lag + 1)
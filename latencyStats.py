@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+
+import bisect
+import threading
+
+# Bucket upper bounds from 10 us to ~30 min, a factor of sqrt(2) apart.
+BUCKET_BOUNDS = [1e-5 * 2 ** (i / 2) for i in range(55)]
+PERCENTILES = (50, 90, 99)
+
+class LatencyHistogram:
+    """Fixed log-spaced buckets: recording is one bisect and one increment, percentiles are bucket upper bounds."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        if self.count == 0:
+            return None
+
+        target = self.count * p / 100
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+    def summary(self):
+        summary = {
+            "count": self.count,
+            "mean": round(self.total / self.count, 6) if self.count else None,
+            "max": round(self.max, 6),
+        }
+        for p in PERCENTILES:
+            value = self.percentile(p)
+            summary[f"p{p}"] = round(min(value, self.max), 6) if value is not None else None
+        return summary
+
+class StageTimings:
+    """Per-stage latency histograms shared by the receiver, classifier and monitor threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def record(self, stage, seconds):
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def summary(self, reset=False):
+        with self._lock:
+            summary = {stage: histogram.summary() for stage, histogram in self._stages.items()}
+            if reset:
+                self._stages = {}
+        return summary
+
+    def peek(self):
+        """summary() without the lock, for metrics scrapes that must not contend with the receiver.
+
+        Copying the stage dict is atomic under the GIL and histograms are
+        only ever incremented, so the worst case is a summary whose fields
+        are one record apart.
+        """
+        return {stage: histogram.summary() for stage, histogram in list(self._stages.items())}
+
+stage_timings = StageTimings()
+
+def format_summary(summary):
+    lines = []
+    for stage, s in summary.items():
+        if not s["count"]:
+            continue
+        lines.append(
+            f"  {stage:18s} n={s['count']:<6d} mean {s['mean'] * 1000:10.1f} ms  "
+            f"p50 {s['p50'] * 1000:10.1f} ms  p90 {s['p90'] * 1000:10.1f} ms  "
+            f"p99 {s['p99'] * 1000:10.1f} ms  max {s['max'] * 1000:10.1f} ms"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+
+import os
+import time
+import zlib
+import pickle
+import struct
+
+# Magic, format version, CRC32 of the pickled payload.
+HEADER = struct.Struct('<4sHI')
+HEADER_MAGIC = b"SLCK"
+CHECKPOINT_VERSION = 1
+CHECKPOINT_INTERVAL = int(os.environ.get("CHECKPOINT_INTERVAL", "60"))
+# Older state describes a different stretch of the night than the one being resumed.
+MAX_CHECKPOINT_AGE = 30 * 60
+
+def checkpoint_path(night_id):
+    return f"Data/{night_id}/checkpoint-{night_id}.bin"
+
+class Checkpointer:
+    """Periodic snapshots of one night's live state, so a restart mid-night resumes instead of starting over.
+
+    A checkpoint is a small header and a pickle of plain containers,
+    written to a temp file, fsynced and renamed over the previous one,
+    so a crash mid-write leaves the last good checkpoint in place. It is
+    only read back for the same night and if it is at most max_age old.
+    """
+
+    def __init__(self, night_id, interval=CHECKPOINT_INTERVAL, max_age=MAX_CHECKPOINT_AGE):
+        self.night_id = night_id
+        self.path = checkpoint_path(night_id)
+        self.interval = interval
+        self.max_age = max_age
+        self.last_write = time.monotonic()
+        self.writes = 0
+
+    def due(self):
+        return self.interval > 0 and time.monotonic() - self.last_write >= self.interval
+
+    def write(self, state):
+        # A failed write is retried at the next interval rather than on every call.
+        self.last_write = time.monotonic()
+        payload = pickle.dumps(
+            {"night_id": self.night_id, "saved_at": time.time(), "state": state},
+            protocol=pickle.HIGHEST_PROTOCOL
+        )
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(HEADER.pack(HEADER_MAGIC, CHECKPOINT_VERSION, zlib.crc32(payload)))
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+        self.writes += 1
+        return len(payload) + HEADER.size
+
+    def read(self):
+        """Returns (state, age in seconds), or None if there is no usable checkpoint."""
+        if not os.path.isfile(self.path):
+            return None
+
+        try:
+            with open(self.path, "rb") as f:
+                magic, version, crc = HEADER.unpack(f.read(HEADER.size))
+                payload = f.read()
+
+            if magic != HEADER_MAGIC or version != CHECKPOINT_VERSION or zlib.crc32(payload) != crc:
+                print(f"Ignoring checkpoint {self.path}: wrong format or corrupt")
+                return None
+
+            saved = pickle.loads(payload)
+        except Exception as e:
+            print(f"Ignoring checkpoint {self.path}: {e}")
+            return None
+
+        age = time.time() - saved["saved_at"]
+        if saved["night_id"] != self.night_id or not 0 <= age <= self.max_age:
+            print(f"Ignoring checkpoint {self.path}: {age:.0f}s old")
+            return None
+
+        return saved["state"], age
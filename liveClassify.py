@@ -1,7 +1,6 @@
 #!/usr/bin/python3
 
 import socket
-import struct
 import time
 import os
 from datetime import datetime
@@ -12,6 +11,10 @@ import joblib
 # import queue
 
 import processData as data_processor
+import packetFormat as packet_format
+import modelRegistry as model_registry
+from virtualClock import SystemClock
+from latencyStats import stage_timings
 from formatData import process_window, add_history_features
 
 UDP_IP = "0.0.0.0"
@@ -20,18 +23,71 @@ BUFFER_SIZE = 4096
 PACKETS = 12
 ML_INTERVAL = 2.0
 PATH = "ML/"
+REGISTRY_PATH = PATH + "registry/"
+RELOAD_INTERVAL = 30
+MMAP_MODE = "r"
 
-in_bed_model = joblib.load(PATH + 'in_bed_model.joblib')
-in_bed_model.verbose = 0
-in_bed_encoder = joblib.load(PATH + 'in_bed_encoder.joblib')    
+clock = SystemClock()
 
-asleep_model = joblib.load(PATH + 'asleep_model.joblib')
-asleep_model.verbose = 0
-asleep_encoder = joblib.load(PATH + 'asleep_encoder.joblib')
+class ModelSet:
+    def __init__(self, version, models):
+        self.version = version
+        self.in_bed_model, self.in_bed_encoder = models['in_bed']
+        self.asleep_model, self.asleep_encoder = models['asleep']
+        self.state_model, self.state_encoder = models['state']
 
-state_model = joblib.load(PATH + 'state_model.joblib')
-state_model.verbose = 0
-state_encoder = joblib.load(PATH + 'state_encoder.joblib')
+def load_legacy_models(path=PATH, mmap_mode=MMAP_MODE):
+    models = {}
+    for name in model_registry.MODEL_NAMES:
+        model = joblib.load(path + f'{name}_model.joblib', mmap_mode=mmap_mode)
+        model.verbose = 0
+        models[name] = (model, joblib.load(path + f'{name}_encoder.joblib'))
+    return models
+
+def load_model_set(registry_path=REGISTRY_PATH):
+    version = model_registry.get_current(registry_path)
+
+    if version is None:
+        return ModelSet("legacy", load_legacy_models())
+
+    manifest, models = model_registry.load_version(version, registry_path, mmap_mode=MMAP_MODE)
+    return ModelSet(version, models)
+
+# Models are loaded by the registry watcher so importing this module stays cheap.
+active_models = None
+models_lock = threading.Lock()
+models_ready = threading.Event()
+
+def get_active_models():
+    with models_lock:
+        return active_models
+
+def watch_registry(until=None, registry_path=REGISTRY_PATH):
+    print("Model registry watcher started")
+
+    while until is None or datetime.now() < until:
+        refresh_models(registry_path)
+        time.sleep(RELOAD_INTERVAL)
+
+def refresh_models(registry_path=REGISTRY_PATH):
+    """Load the registry's current version if it isn't the active one yet."""
+    global active_models
+
+    try:
+        current_models = get_active_models()
+        version = model_registry.get_current(registry_path)
+
+        if current_models is None or (version is not None and version != current_models.version):
+            start = time.perf_counter()
+            new_models = load_model_set(registry_path)
+
+            with models_lock:
+                active_models = new_models
+            models_ready.set()
+
+            print(f"Switched to model version {new_models.version} in {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        print(f"Error loading model version: {e}")
 
 # result_queue = queue.Queue()
 
@@ -49,6 +105,20 @@ class RollingBuffer:
         
         with self.lock:
             self.buffer.extend(new_data)
+
+    def prefill(self, df):
+        """Puts older samples, e.g. the raw store's tail after a restart, in front of what the buffer already holds."""
+        if df is None or df.empty:
+            return
+
+        older = list(zip(df['datetime'], df['voltage']))
+
+        with self.lock:
+            if self.buffer:
+                older = [sample for sample in older if sample[0] < self.buffer[0][0]]
+            room = self.max_len - len(self.buffer)
+            if room > 0 and older:
+                self.buffer.extendleft(reversed(older[-room:]))
             
     def get_snapshot(self):
         with self.lock:
@@ -79,8 +149,36 @@ class HistoryBuffer:
         with self.lock:
             self.buffer.clear()
         
+class ResultChannel:
+    def __init__(self, max_length):
+        self.buffer = deque(maxlen=max_length)
+        self.condition = threading.Condition()
+
+    def publish(self, data):
+        with self.condition:
+            self.buffer.append(data)
+            self.condition.notify()
+
+    def drain(self, timeout=None):
+        with self.condition:
+            self.condition.wait_for(lambda: len(self.buffer) > 0, timeout=timeout)
+            data = list(self.buffer)
+            self.buffer.clear()
+            return data
+
 history_buffer = HistoryBuffer(max_length=12)
-classify_history_buffer = HistoryBuffer(max_length=30)
+classification_channel = ResultChannel(max_length=300)
+# Only written by the classify thread.
+classification_stats = {"count": 0, "last_label": None, "last_time": None}
+
+class BedClassifier:
+    """One bed's classification state in multi-bed mode; the single-bed service uses the module-level buffers."""
+
+    def __init__(self):
+        self.live_buffer = RollingBuffer(window_seconds=30, sample_rate=100)
+        self.history_buffer = HistoryBuffer(max_length=12)
+        self.classification_channel = ResultChannel(max_length=300)
+        self.classification_stats = {"count": 0, "last_label": None, "last_time": None}
 
 def predict_with_model(model, encoder, full_data_row):
     required_features = model.feature_names_in_
@@ -92,16 +190,18 @@ def predict_with_model(model, encoder, full_data_row):
     
     return label
 
-def classify_snippet(snippet):
+def classify_snippet(snippet, models=None):
+    if models is None:
+        models = get_active_models()
 
     X_input = snippet.drop(columns=['timestamp'])
 
-    ib_label = predict_with_model(in_bed_model, in_bed_encoder, X_input)
+    ib_label = predict_with_model(models.in_bed_model, models.in_bed_encoder, X_input)
 
     if ib_label == 'inBed':
-        slp_label = predict_with_model(asleep_model, asleep_encoder, X_input)
+        slp_label = predict_with_model(models.asleep_model, models.asleep_encoder, X_input)
         if slp_label == 'Asleep':
-            state_label = predict_with_model(state_model, state_encoder, X_input)
+            state_label = predict_with_model(models.state_model, models.state_encoder, X_input)
             return state_label#f"{ib_label}, {slp_label}, {state_label}"
         else:
             return slp_label#f"{ib_label}, {slp_label}"
@@ -109,75 +209,93 @@ def classify_snippet(snippet):
         return ib_label#f"{ib_label}"
 
 def parse_packet(data):
-    remainder = len(data) % 2
-    if remainder != 0:
-        data = data[:-remainder] 
-        
-    count = len(data) // 2
-    if count == 0:
-        return []
-        
-    return struct.unpack(f'<{count}h', data)
+    # Standalone mode stamps samples on arrival, so any header is just skipped.
+    return packet_format.parse_packet(data)[1]
 
-def classify(date=None, until=None):
-    print("Classification worker started")
+def classify_tick(models, date=None, state=None):
+    if state is None:
+        buffer, history_store, channel, stats = live_buffer, history_buffer, classification_channel, classification_stats
+    else:
+        buffer, history_store, channel, stats = state.live_buffer, state.history_buffer, state.classification_channel, state.classification_stats
 
-    while until is None or datetime.now() < until:
-        time.sleep(ML_INTERVAL)
+    # 1. Get Cleaned Data from Buffer
+    times, voltages = buffer.get_snapshot()
 
-        # 1. Get Cleaned Data from Buffer
-        times, voltages = live_buffer.get_snapshot()
+    if times is None or voltages is None:
+        return None
 
-        if times is None or voltages is None:
-            continue
+    # Age of the newest sample when the tick starts: how long data waits in the buffer.
+    newest_sample = times[-1].timestamp()
+    stage_timings.record("buffer_wait", clock.time() - newest_sample)
+    features_start = time.perf_counter()
 
-        df = pd.DataFrame({
-            'datetime': times,
-            'voltage': voltages
-        })
+    df = pd.DataFrame({
+        'datetime': times,
+        'voltage': voltages
+    })
 
-        time_array = df['datetime'].values
-        voltage_array = df['voltage'].values
-        first_ts = df['datetime'].iloc[0]
+    time_array = df['datetime'].values
+    voltage_array = df['voltage'].values
+    first_ts = df['datetime'].iloc[0]
 
-        snippet = process_window(time_array, voltage_array, first_ts, 30)
+    snippet = process_window(time_array, voltage_array, first_ts, 30)
 
-        if snippet is None:
-            continue
+    if snippet is None:
+        return None
 
-        history = history_buffer.get_data()
-        history_buffer.add_data(snippet)
-        snippet = history + [snippet]
-        
-        snippet = pd.DataFrame(snippet).drop(columns=['sleep_state'], errors='ignore')
-        snippet = add_history_features(snippet)
-        
-        classification = classify_snippet(snippet)
-        timestamp = datetime.now()
+    history = history_store.get_data()
+    history_store.add_data(snippet)
+    snippet = history + [snippet]
+    
+    snippet = pd.DataFrame(snippet).drop(columns=['sleep_state'], errors='ignore')
+    snippet = add_history_features(snippet)
+    stage_timings.record("features", time.perf_counter() - features_start)
+
+    inference_start = time.perf_counter()
+    classification = classify_snippet(snippet, models)
+    stage_timings.record("inference", time.perf_counter() - inference_start)
+    timestamp = clock.now()
+
+    channel.publish((timestamp, classification, newest_sample))
+    stats["count"] += 1
+    stats["last_label"] = classification
+    stats["last_time"] = clock.time()
+
+    # result_queue.put({
+    #     "timestamp": timestamp,
+    #     "state": classification
+    # })
+    
+    # print(f"Classified state: {classification} at {timestamp}")
 
-        classify_history_buffer.add_data((timestamp, classification))
+    if date:
+        file_exists = os.path.isfile(f"Data/{date}/classification-{date}.csv")
 
-        # result_queue.put({
-        #     "timestamp": timestamp,
-        #     "state": classification
-        # })
+        processed_df = pd.DataFrame([{
+            'timestamp': time_array[0],
+            'classification': classification
+        }])
         
-        # print(f"Classified state: {classification} at {timestamp}")
+        processed_df.to_csv(
+            f"Data/{date}/classification-{date}.csv", 
+            mode='a', 
+            header=not file_exists, 
+            index=False
+        )
 
-        if date:
-                file_exists = os.path.isfile(f"Data/{date}/classification-{date}.csv")
+    return classification
 
-                processed_df = pd.DataFrame([{
-                    'timestamp': time_array[0],
-                    'classification': classification
-                }])
-                
-                processed_df.to_csv(
-                    f"Data/{date}/classification-{date}.csv", 
-                    mode='a', 
-                    header=not file_exists, 
-                    index=False
-                )
+def classify(date=None, until=None):
+    print("Classification worker started")
+
+    while until is None or clock.now() < until:
+        clock.sleep(ML_INTERVAL)
+
+        models = get_active_models()
+        if models is None:
+            continue
+
+        classify_tick(models, date)
 
 def start_workers(date,until=None):
     if date:
@@ -187,9 +305,12 @@ def start_workers(date,until=None):
         args = (date, until)
     else:
         args = ()
-    classify_thread = threading.Thread(target=classify, args=args, daemon=True)
+    classify_thread = threading.Thread(target=classify, args=args, name="classify", daemon=True)
     classify_thread.start()
 
+    watcher_thread = threading.Thread(target=watch_registry, args=(until,), name="registry-watcher", daemon=True)
+    watcher_thread.start()
+
 def run(date=None, until=None):
     print(f"Starting classification workers..., date: {date}")
     start_workers(date, until)
@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9105
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class MetricsWriter:
+    """Builds Prometheus text exposition, writing HELP/TYPE once per metric name."""
+
+    def __init__(self):
+        self.lines = []
+        self._described = set()
+
+    def add(self, name, value, help_text, metric_type="gauge", labels=None):
+        if value is None:
+            return
+
+        if name not in self._described:
+            self._described.add(name)
+            self.lines.append(f"# HELP {name} {help_text}")
+            self.lines.append(f"# TYPE {name} {metric_type}")
+
+        label_text = ""
+        if labels:
+            label_text = "{" + ",".join(f'{key}="{escape_label(label)}"' for key, label in labels.items()) + "}"
+        value_text = str(int(value)) if isinstance(value, int) else repr(float(value))
+        self.lines.append(f"{name}{label_text} {value_text}")
+
+    def text(self):
+        return "\n".join(self.lines) + "\n"
+
+def resident_memory_bytes():
+    """Current RSS from procfs (no disk access); None where /proc isn't available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+def udp_socket_drops(port):
+    """Datagrams the kernel dropped for the UDP socket bound to port (its receive buffer was full)."""
+    try:
+        with open("/proc/net/udp") as f:
+            lines = f.readlines()[1:]
+    except OSError:
+        return None
+
+    for line in lines:
+        fields = line.split()
+        if int(fields[1].split(":")[1], 16) == port:
+            return int(fields[-1])
+    return None
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        try:
+            if self.path == "/metrics":
+                status, body = 200, self.server.collect()
+            elif self.path == "/health":
+                healthy, body = self.server.health()
+                status = 200 if healthy else 503
+            else:
+                self.send_error(404)
+                return
+        except Exception as e:
+            status, body = 500, f"error collecting metrics: {e}\n"
+
+        body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(collect, health, host=METRICS_HOST, port=METRICS_PORT):
+    """Serve collect() on /metrics and health() on /health from a daemon thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    server.collect = collect
+    server.health = health
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
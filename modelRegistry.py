@@ -0,0 +1,158 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+from datetime import datetime
+import joblib
+
+REGISTRY_PATH = "ML/registry/"
+CURRENT_POINTER = "current"
+MANIFEST = "manifest.json"
+STAGING_PREFIX = ".staging-"
+MODEL_NAMES = ["in_bed", "asleep", "state"]
+
+def file_checksum(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def write_atomic(file_path, text):
+    temp_path = file_path + ".tmp"
+    with open(temp_path, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, file_path)
+
+def begin_version(registry_path=REGISTRY_PATH):
+    version = datetime.now().strftime("%Y%m%d-%H%M%S")
+    staging_path = os.path.join(registry_path, STAGING_PREFIX + version)
+    os.makedirs(staging_path)
+    return staging_path + "/"
+
+def discard_staging(staging_path):
+    shutil.rmtree(staging_path, ignore_errors=True)
+
+def commit_version(staging_path, registry_path=REGISTRY_PATH, activate=True):
+    staging_path = staging_path.rstrip("/")
+    version = os.path.basename(staging_path)[len(STAGING_PREFIX):]
+
+    models = {}
+    for name in MODEL_NAMES:
+        model_file = f"{name}_model.joblib"
+        encoder_file = f"{name}_encoder.joblib"
+        meta_file = f"{name}_meta.json"
+
+        with open(os.path.join(staging_path, meta_file)) as f:
+            meta = json.load(f)
+
+        models[name] = {
+            "model": model_file,
+            "encoder": encoder_file,
+            "meta": meta_file,
+            "features": meta.get("features", []),
+            "inference_seconds_per_call": meta.get("inference_seconds_per_call"),
+            "checksums": {
+                file_name: file_checksum(os.path.join(staging_path, file_name))
+                for file_name in (model_file, encoder_file, meta_file)
+            }
+        }
+
+    manifest = {
+        "version": version,
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "models": models
+    }
+    write_atomic(os.path.join(staging_path, MANIFEST), json.dumps(manifest, indent=4))
+
+    for file_name in os.listdir(staging_path):
+        os.chmod(os.path.join(staging_path, file_name), 0o444)
+
+    version_path = os.path.join(registry_path, version)
+    os.rename(staging_path, version_path)
+
+    if activate:
+        set_current(version, registry_path)
+
+    return version
+
+def list_versions(registry_path=REGISTRY_PATH):
+    if not os.path.isdir(registry_path):
+        return []
+
+    return sorted(
+        name for name in os.listdir(registry_path)
+        if not name.startswith(STAGING_PREFIX)
+        and os.path.isfile(os.path.join(registry_path, name, MANIFEST))
+    )
+
+def get_current(registry_path=REGISTRY_PATH):
+    pointer_path = os.path.join(registry_path, CURRENT_POINTER)
+    if not os.path.isfile(pointer_path):
+        return None
+
+    with open(pointer_path) as f:
+        version = f.read().strip()
+    return version or None
+
+def set_current(version, registry_path=REGISTRY_PATH):
+    if version not in list_versions(registry_path):
+        raise FileNotFoundError(f"Model version {version} not found in {registry_path}")
+
+    write_atomic(os.path.join(registry_path, CURRENT_POINTER), version)
+
+def rollback(registry_path=REGISTRY_PATH):
+    versions = list_versions(registry_path)
+    current = get_current(registry_path)
+
+    if current not in versions or versions.index(current) == 0:
+        raise RuntimeError(f"No version older than {current} to roll back to")
+
+    previous = versions[versions.index(current) - 1]
+    set_current(previous, registry_path)
+    return previous
+
+def read_manifest(version, registry_path=REGISTRY_PATH):
+    with open(os.path.join(registry_path, version, MANIFEST)) as f:
+        return json.load(f)
+
+def load_version(version, registry_path=REGISTRY_PATH, mmap_mode=None):
+    version_path = os.path.join(registry_path, version)
+    manifest = read_manifest(version, registry_path)
+
+    models = {}
+    for name, entry in manifest["models"].items():
+        for file_name, checksum in entry["checksums"].items():
+            if file_checksum(os.path.join(version_path, file_name)) != checksum:
+                raise ValueError(f"Checksum mismatch for {file_name} in model version {version}")
+
+        model = joblib.load(os.path.join(version_path, entry["model"]), mmap_mode=mmap_mode)
+        model.verbose = 0
+        encoder = joblib.load(os.path.join(version_path, entry["encoder"]))
+
+        if list(model.feature_names_in_) != entry["features"]:
+            raise ValueError(f"Feature list for {name} does not match manifest in model version {version}")
+
+        models[name] = (model, encoder)
+
+    return manifest, models
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+
+    if command == "list":
+        current = get_current()
+        for version in list_versions():
+            print(f"{'*' if version == current else ' '} {version}")
+    elif command == "rollback":
+        print(f"Current model version is now {rollback()}")
+    elif command == "activate" and len(sys.argv) > 2:
+        set_current(sys.argv[2])
+        print(f"Current model version is now {sys.argv[2]}")
+    else:
+        print("Usage: modelRegistry.py [list | rollback | activate <version>]")
@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import glob
+import time
+import pandas as pd
+
+from formatData import add_history_features, format_raw_night
+from liveClassify import load_model_set
+
+def predict_labels(model, encoder, X):
+    return encoder.inverse_transform(model.predict(X[model.feature_names_in_]))
+
+def classify_table(features_df, models):
+    """Run the in-bed -> asleep -> state cascade over every row with one predict call per stage."""
+    X = features_df.drop(columns=['timestamp', 'sleep_state'], errors='ignore')
+
+    if 'rolling_variance' not in X.columns:
+        X = add_history_features(features_df.drop(columns=['sleep_state'], errors='ignore')).drop(columns=['timestamp'])
+
+    labels = predict_labels(models.in_bed_model, models.in_bed_encoder, X).astype(object)
+
+    in_bed = labels == 'inBed'
+    if in_bed.any():
+        labels[in_bed] = predict_labels(models.asleep_model, models.asleep_encoder, X[in_bed])
+
+    asleep = labels == 'Asleep'
+    if asleep.any():
+        labels[asleep] = predict_labels(models.state_model, models.state_encoder, X[asleep])
+
+    return pd.DataFrame({
+        'timestamp': pd.to_datetime(features_df['timestamp']).values,
+        'classification': labels
+    })
+
+def load_night_features(night_id):
+    formatted_path = f"Data/{night_id}/formatted_data-{night_id}.csv"
+    raw_path = f"Data/{night_id}/raw_data-{night_id}.csv"
+
+    if os.path.isfile(formatted_path):
+        return pd.read_csv(formatted_path, parse_dates=['timestamp'])
+    if os.path.isfile(raw_path):
+        return format_raw_night(raw_path, night_id)
+    return None
+
+def classify_night(night_id, models, output_path=None):
+    features_df = load_night_features(night_id)
+    if features_df is None or features_df.empty:
+        print(f"No formatted or raw data for night {night_id}")
+        return None
+
+    classification_df = classify_table(features_df, models)
+
+    if output_path is None:
+        output_path = f"Data/{night_id}/classification-{night_id}.csv"
+
+    classification_df.to_csv(output_path, index=False)
+    return classification_df
+
+def available_nights():
+    paths = glob.glob(os.path.join('Data', '*', 'formatted_data-*.csv')) + glob.glob(os.path.join('Data', '*', 'raw_data-*.csv'))
+    return sorted({os.path.basename(os.path.dirname(path)) for path in paths})
+
+def run(night_ids=None):
+    models = load_model_set()
+    for model in (models.in_bed_model, models.asleep_model, models.state_model):
+        model.n_jobs = -1
+
+    night_ids = night_ids or available_nights()
+    print(f"Classifying {len(night_ids)} nights with model version {models.version}")
+
+    start = time.perf_counter()
+    for night_id in night_ids:
+        night_start = time.perf_counter()
+        classification_df = classify_night(night_id, models)
+        if classification_df is not None:
+            counts = classification_df['classification'].value_counts().to_dict()
+            print(f"  {night_id}: {len(classification_df)} rows in {time.perf_counter() - night_start:.2f}s {counts}")
+
+    print(f"Done in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    run(sys.argv[1:])
@@ -0,0 +1,172 @@
+#!/usr/bin/python3
+
+import struct
+from collections import OrderedDict
+
+# Optional header: magic, packet sequence number, sensor sample counter of
+# the first sample, sensor sample rate (Hz), device id (0 if unset). Packets
+# without the magic are the original headerless int16 samples.
+HEADER = struct.Struct('<4sIIHH')
+HEADER_MAGIC = b"SAP1"
+COUNTER_MODULO = 2 ** 32
+REORDER_WINDOW = 64
+MAX_GAP = 100000
+# Consecutive packets from behind `expected` that mean the sensor restarted within MAX_GAP.
+RESTART_PACKETS = 8
+MAX_SENSOR_LAG = 1.0
+
+def parse_packet(data):
+    """Returns (header, samples); header is (sequence, counter, sample_rate, device_id) or None for a legacy packet.
+
+    A header with a zero sample rate is malformed and the packet comes back empty.
+    """
+    header = None
+    if len(data) >= HEADER.size and data[:4] == HEADER_MAGIC:
+        _, sequence, counter, sample_rate, device_id = HEADER.unpack_from(data)
+        if sample_rate == 0:
+            return None, []
+        header = (sequence, counter, sample_rate, device_id)
+        data = data[HEADER.size:]
+
+    remainder = len(data) % 2
+    if remainder != 0:
+        data = data[:-remainder]
+
+    count = len(data) // 2
+    if count == 0:
+        return header, []
+
+    return header, struct.unpack(f'<{count}h', data)
+
+def build_packet(sequence, counter, sample_rate, samples, device_id=0):
+    """samples is already-encoded int16 little-endian bytes."""
+    return HEADER.pack(HEADER_MAGIC, sequence % COUNTER_MODULO, counter % COUNTER_MODULO, sample_rate, device_id) + samples
+
+class SequenceTracker:
+    """Counts lost, reordered and duplicate packets from their sequence numbers.
+
+    Both ends of a gap, REORDER_WINDOW numbers each, are remembered so a
+    packet from either end that turns up late is placed, not miscounted.
+    A packet behind `expected` that isn't one of those is stale and
+    dropped. Only a packet more than MAX_GAP behind, or RESTART_PACKETS
+    stale packets in sequence, mean the sensor restarted. Only the
+    receiver thread calls update(); report() may be read from anywhere,
+    as it only copies integers.
+    """
+
+    def __init__(self):
+        self.expected = None
+        self.missing = OrderedDict()
+        self.packets = 0
+        self.lost = 0
+        self.reordered = 0
+        self.duplicates = 0
+        self.stale = 0
+        self.stale_run = 0
+        self.last_stale = None
+        self.resets = 0
+        self.samples_lost = 0
+        self.max_gap = 0
+        self.expected_counter = None
+
+    def update(self, sequence, counter, sample_count):
+        """Returns "ok", "gap", "late", "duplicate", "stale" or "reset"."""
+        self.packets += 1
+
+        if self.expected is None:
+            status = "ok"
+        else:
+            ahead = (sequence - self.expected) % COUNTER_MODULO
+            behind = (self.expected - sequence) % COUNTER_MODULO
+            if ahead == 0:
+                status = "ok"
+            elif ahead <= MAX_GAP:
+                status = "gap"
+                self.lost += ahead
+                self.max_gap = max(self.max_gap, ahead)
+                self.samples_lost += (counter - self.expected_counter) % COUNTER_MODULO
+                ends = range(ahead) if ahead <= 2 * REORDER_WINDOW else [
+                    *range(REORDER_WINDOW), *range(ahead - REORDER_WINDOW, ahead)
+                ]
+                for i in ends:
+                    self.missing[(self.expected + i) % COUNTER_MODULO] = True
+                while len(self.missing) > 2 * REORDER_WINDOW:
+                    self.missing.popitem(last=False)
+            elif sequence in self.missing:
+                del self.missing[sequence]
+                self.lost -= 1
+                self.reordered += 1
+                self.samples_lost -= sample_count
+                self.stale_run = 0
+                return "late"
+            elif behind <= MAX_GAP and not self._restarted(sequence):
+                if behind <= REORDER_WINDOW:
+                    self.duplicates += 1
+                    return "duplicate"
+                self.stale += 1
+                return "stale"
+            else:
+                # The sensor restarted and its counters began again.
+                status = "reset"
+                self.resets += 1
+                self.missing.clear()
+
+        self.stale_run = 0
+        self.expected = (sequence + 1) % COUNTER_MODULO
+        self.expected_counter = (counter + sample_count) % COUNTER_MODULO
+        return status
+
+    def _restarted(self, sequence):
+        """Whether this packet behind `expected` completes a run of RESTART_PACKETS in sequence."""
+        if self.stale_run and sequence == (self.last_stale + 1) % COUNTER_MODULO:
+            self.stale_run += 1
+        else:
+            self.stale_run = 1
+        self.last_stale = sequence
+        return self.stale_run >= RESTART_PACKETS
+
+    def report(self):
+        expected_packets = self.packets + self.lost - self.duplicates
+        return {
+            "packets": self.packets,
+            "lost": self.lost,
+            "reordered": self.reordered,
+            "duplicates": self.duplicates,
+            "stale": self.stale,
+            "resets": self.resets,
+            "samples_lost": self.samples_lost,
+            "max_gap_packets": self.max_gap,
+            "loss_rate": round(self.lost / expected_packets, 6) if expected_packets else 0.0
+        }
+
+class SensorClock:
+    """Maps the sensor's sample counter to host time.
+
+    Samples are spaced exactly 1/sample_rate apart from an anchor. The
+    anchor follows the earliest arrivals, since a packet can't arrive
+    before its last sample was taken, and is pulled forward if the
+    sensor's clock runs slow enough that packets arrive more than
+    MAX_SENSOR_LAG late.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counter0 = None
+        self.time0 = None
+
+    def timestamps(self, counter, sample_count, sample_rate, arrival):
+        """Host times of a packet's samples, given the counter of its first sample and its arrival time."""
+        if self.counter0 is None:
+            self.counter0, self.time0 = counter, arrival - (sample_count - 1) / sample_rate
+
+        last = self.time0 + ((counter - self.counter0) % COUNTER_MODULO + sample_count - 1) / sample_rate
+
+        if last > arrival:
+            self.time0 -= last - arrival
+        elif arrival - last > MAX_SENSOR_LAG:
+            self.time0 += arrival - last - MAX_SENSOR_LAG
+
+        first = self.time0 + ((counter - self.counter0) % COUNTER_MODULO) / sample_rate
+        return [first + i / sample_rate for i in range(sample_count)]
@@ -16,6 +16,10 @@ def redistribute_timestamps_linear(df):
     if len(unique_timestamps) < 2:
         return df
 
+    # Already one timestamp per sample (sensor counter packets); a late packet may just need sorting into place.
+    if len(unique_timestamps) == len(df):
+        return df.sort_values('timestamp_unix', kind='stable').reset_index(drop=True)
+
     avg_gap = np.mean(np.diff(unique_timestamps))
 
     new_rows = []
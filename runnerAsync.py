@@ -0,0 +1,309 @@
+#!/usr/bin/python3
+
+import math
+import time
+import signal
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as dt_time
+
+import runnerLive as runner
+from actionScheduler import AsyncActionScheduler
+from latencyStats import stage_timings
+from metricsServer import start_metrics_server
+from samplingProfiler import SamplingProfiler
+from packetFormat import parse_packet
+from liveCheckpoint import Checkpointer
+
+CUTOFF = dt_time(14, 00, 0, 0)
+
+class SensorProtocol(asyncio.DatagramProtocol):
+    """runnerLive's receiver as a DatagramProtocol: packets are parsed and stamped on the loop, batches go to the DSP executor."""
+
+    def __init__(self, orchestrator):
+        self.orchestrator = orchestrator
+        self.accumulator = []
+        self.first_packet = True
+
+    def datagram_received(self, data, addr):
+        timestamp = runner.clock.time()
+        header, adc_values = parse_packet(data)
+        if not adc_values:
+            return
+
+        new_entries = runner.stamp_samples(header, adc_values, timestamp, runner.sequence_tracker, runner.sensor_clock)
+        if new_entries is None:
+            return
+
+        if self.first_packet:
+            print(f"Connected to {addr[0]}:{addr[1]}")
+            self.first_packet = False
+            self.orchestrator.write_event("receiver_first_packet")
+
+        runner.receiver_stats["packets"] += 1
+        runner.receiver_stats["samples"] += len(adc_values)
+
+        self.orchestrator.store(new_entries)
+        self.accumulator.extend(new_entries)
+        if len(self.accumulator) >= runner.BATCH_THRESHOLD:
+            batch, self.accumulator = self.accumulator, []
+            self.orchestrator.process_batch(batch)
+
+    def error_received(self, exc):
+        print(f"Receiver error: {exc}")
+
+class SwitchProtocol(asyncio.DatagramProtocol):
+    def __init__(self, orchestrator):
+        self.orchestrator = orchestrator
+        self.prev = ""
+
+    def datagram_received(self, data, addr):
+        message = data.decode("utf-8", errors="replace").strip()
+        if message == self.prev:
+            return
+
+        self.prev = message
+        print(f"Switch Event Received: {message} from {addr}")
+        self.orchestrator.in_store_executor(
+            runner.store_data.write_switch_event, self.orchestrator.night_context.night_id, message, time.time()
+        )
+
+class Orchestrator:
+    """Runs the single-bed live service on one asyncio loop instead of polling worker threads.
+
+    Nothing wakes up without work to do: packets arrive through
+    DatagramProtocols, classification ticks follow a fixed ML_INTERVAL
+    grid, and the raw store is flushed when a batch is queued rather than
+    polled. Blocking work runs in executors and is awaited: DSP batches on
+    one thread (batches must stay in order), inference plus the monitor
+    on another, raw-store writes on a third, night actions through an
+    AsyncActionScheduler, and file and calendar I/O on the loop's default
+    executor. How late each tick fires is recorded as "tick_lateness".
+    """
+
+    def __init__(self, night_context):
+        self.night_context = night_context
+        self.events_file = f"Data/{night_context.night_id}/sleep_events-{night_context.night_id}.json"
+        self.dsp_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dsp")
+        self.inference_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self.store_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="store")
+        # One worker per action type, so a run never waits behind another type.
+        self.action_executor = ThreadPoolExecutor(max_workers=len(runner.ACTION_TYPES), thread_name_prefix="action")
+        # The orchestrator's own events-file writes, kept in order on one thread.
+        self.events_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="events")
+        self.loop = None
+        self.stopped = None
+        self.flushing = False
+        self.monitor = None
+        self.checkpointer = Checkpointer(night_context.night_id)
+        self.tasks = {}
+
+    def in_executor(self, executor, func, *args):
+        """Run func in executor, logging rather than losing any exception."""
+        future = self.loop.run_in_executor(executor, func, *args)
+        future.add_done_callback(self._log_failure)
+        return future
+
+    def in_store_executor(self, func, *args):
+        return self.in_executor(self.store_executor, func, *args)
+
+    def _log_failure(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Executor job failed: {future.exception()}")
+
+    def write_event(self, event_type, details=None):
+        self.in_executor(self.events_executor, runner.save_event_to_json, event_type, runner.clock.now(), self.events_file, details)
+
+    def store(self, entries):
+        queue = runner.store_data.write_queue
+        queue.put(entries)
+
+        if len(queue) >= runner.BATCH_THRESHOLD and not self.flushing:
+            self.flushing = True
+            self.in_store_executor(self.flush_store).add_done_callback(self._flush_done)
+
+    def _flush_done(self, future):
+        self.flushing = False
+
+    def flush_store(self, final=False):
+        queue = runner.store_data.write_queue
+        night_id = self.night_context.night_id
+
+        gaps = queue.take_gaps()
+        if gaps:
+            runner.store_data.write_gaps(night_id, gaps)
+
+        while len(queue) >= runner.BATCH_THRESHOLD or (final and len(queue)):
+            runner.store_data.store_batch(night_id, queue.drain())
+
+    def process_batch(self, batch):
+        self.in_executor(self.dsp_executor, runner.process_accumulated, batch, self.night_context.night_id)
+
+    def classify_tick(self, models):
+        try:
+            runner.classifier.classify_tick(models, self.night_context.night_id)
+            for result in runner.classifier.classification_channel.drain(timeout=0):
+                self.monitor.process(*result)
+            runner.checkpoint_if_due(self.checkpointer, self.monitor, runner.classifier.history_buffer)
+        except Exception as e:
+            runner.log_error_to_json(f"classify tick error: {e}", file_path=self.events_file)
+
+    async def classify_ticks(self):
+        interval = runner.classifier.ML_INTERVAL
+        next_tick = self.loop.time() + interval
+
+        while True:
+            await asyncio.sleep(next_tick - self.loop.time())
+            stage_timings.record("tick_lateness", max(0.0, self.loop.time() - next_tick))
+
+            models = runner.classifier.get_active_models()
+            if models is not None:
+                await self.loop.run_in_executor(self.inference_executor, self.classify_tick, models)
+
+            # Ticks stay on the grid; any an overrunning tick covered are skipped, not bunched up.
+            next_tick += interval
+            if self.loop.time() > next_tick:
+                next_tick += math.ceil((self.loop.time() - next_tick) / interval) * interval
+
+    async def watch_registry(self):
+        print("Model registry watcher started")
+        while True:
+            await self.loop.run_in_executor(None, runner.classifier.refresh_models)
+            await asyncio.sleep(runner.classifier.RELOAD_INTERVAL)
+
+    async def report_latency(self):
+        while True:
+            await asyncio.sleep(runner.LATENCY_SUMMARY_INTERVAL)
+            await self.loop.run_in_executor(self.events_executor, runner.write_latency_summary, self.night_context)
+
+    async def prefetch_calendar(self):
+        service = await self.loop.run_in_executor(None, runner.get_calendar_service)
+        from getCalendarData import PREFETCH_INTERVAL
+
+        print("Calendar prefetcher started")
+        while True:
+            await self.loop.run_in_executor(None, service.prefetch_once)
+            await asyncio.sleep(PREFETCH_INTERVAL)
+
+    def start_task(self, name, coroutine):
+        self.tasks[name] = self.loop.create_task(coroutine, name=name)
+
+    def health(self):
+        stopped = [name for name, task in self.tasks.items() if task.done()]
+        if stopped:
+            return False, f"tasks not running: {', '.join(stopped)}\n"
+        # Threads the loop doesn't replace, such as the in-process alarm scheduler.
+        return runner.metrics_health()
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        night_context = self.night_context
+        night_id = night_context.night_id
+
+        # Bound first so the kernel queues packets while the pipeline imports.
+        with runner.startup_timer.phase("bind_socket"):
+            sock = runner.bind_receiver()
+
+        await self.loop.run_in_executor(self.events_executor, runner.save_event_to_json, "service_started", datetime.now(), self.events_file)
+        await self.loop.run_in_executor(None, runner.tonight_sleep.load, self.events_file)
+
+        # The loop's tasks replace the worker threads, so /health checks those plus any remaining threads.
+        runner.EXPECTED_THREADS = []
+        if runner.METRICS_PORT:
+            start_metrics_server(runner.collect_metrics, self.health, port=int(runner.METRICS_PORT))
+
+        profiler = SamplingProfiler(f"Data/{night_id}")
+        self.loop.add_signal_handler(signal.SIGUSR1, profiler.toggle)
+        self.loop.add_signal_handler(signal.SIGTERM, self.stopped.set)
+
+        print(f"Running data collection and classification until {night_context.until} for night: {night_id}")
+
+        await self.loop.run_in_executor(None, runner.load_pipeline_modules)
+        runner.action_scheduler = AsyncActionScheduler(self.loop, self.action_executor)
+
+        if runner.store_data.write_queue.policy == "block":
+            # A blocking put would stall the whole loop.
+            print("INGEST_POLICY=block would stall the event loop; using drop-oldest")
+            runner.store_data.write_queue.policy = "drop-oldest"
+        runner.store_data.write_queue.spill_path = f"Data/{night_id}/spill-{night_id}.bin"
+
+        if runner.ALARM_BACKEND == "inprocess":
+            runner.get_alarm_timers()
+
+        night_state = runner.NightState(None)
+        self.monitor = runner.classification_monitor = runner.ClassificationMonitor(night_context, night_state)
+        with runner.startup_timer.phase("warm_start"):
+            resumed = await self.loop.run_in_executor(
+                None, runner.warm_start, self.monitor, runner.classifier.history_buffer, runner.classifier.live_buffer, self.checkpointer
+            )
+
+        with runner.startup_timer.phase("start_workers"):
+            sensor_transport, _ = await self.loop.create_datagram_endpoint(lambda: SensorProtocol(self), sock=sock)
+            switch_transport, _ = await self.loop.create_datagram_endpoint(
+                lambda: SwitchProtocol(self),
+                local_addr=(runner.store_data.UDP_IP, runner.store_data.UDP_PORT_STATE)
+            )
+            runner.startup_timer.record("receiver_ready")
+            self.start_task("registry-watcher", self.watch_registry())
+            self.start_task("latency-report", self.report_latency())
+
+        # Waits for the first model load, so it gets its own thread rather than holding an executor worker.
+        threading.Thread(target=runner.report_startup, args=(night_context,), name="startup-report", daemon=True).start()
+
+        with runner.startup_timer.phase("calendar"):
+            first_event_time = await self.loop.run_in_executor(
+                None, runner.return_first_event_time, night_context.tomorrow.replace(hour=00, minute=00, second=0, microsecond=0)
+            )
+        if first_event_time is None:
+            runner.log_error_to_json("No calendar data available, using default first event time", file_path=self.events_file)
+            first_event_time = datetime.strptime(runner.DEFAULT_FIRST_EVENT_TIME, "%H:%M:%S").time()
+        self.start_task("calendar-prefetch", self.prefetch_calendar())
+
+        if night_state.get_first_event_time() is None:
+            night_state.set_first_event_time(first_event_time)
+        print(first_event_time)
+
+        if resumed and night_state.get_alarm_scheduled() is not None:
+            print(f"Resumed night with alarm at {night_state.get_alarm_scheduled()}")
+        else:
+            with runner.startup_timer.phase("sleep_onset_action"):
+                await self.loop.run_in_executor(None, runner.sleep_onset_action, night_context, night_state, datetime.now())
+
+            with runner.startup_timer.phase("schedule_alarm"):
+                await self.loop.run_in_executor(
+                    None, lambda: runner.schedule_alarm(first_event_time.strftime("%H:%M:%S"), night_context=night_context, night_state=night_state)
+                )
+
+        print("Sleep Tracker Monitor Started...")
+        self.start_task("classify", self.classify_ticks())
+
+        try:
+            await asyncio.wait_for(self.stopped.wait(), timeout=max(0.0, (night_context.until - datetime.now()).total_seconds()))
+            print("Service stopping?")
+        except asyncio.TimeoutError:
+            pass
+
+        sensor_transport.close()
+        switch_transport.close()
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+
+        await self.loop.run_in_executor(self.store_executor, self.flush_store, True)
+        if runner.sequence_tracker.packets:
+            report = runner.sequence_tracker.report()
+            print(f"Packet report: {report}")
+            await self.loop.run_in_executor(self.events_executor, runner.save_event_to_json, "packet_report", runner.clock.now(), self.events_file, report)
+
+        for executor in (self.dsp_executor, self.inference_executor, self.store_executor, self.action_executor, self.events_executor):
+            executor.shutdown(wait=False, cancel_futures=True)
+
+if __name__ == "__main__":
+    night_context = runner.build_night_context(CUTOFF, datetime.now())
+
+    try:
+        asyncio.run(Orchestrator(night_context).run())
+    except KeyboardInterrupt:
+        print("Stopping Service...")
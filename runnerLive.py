@@ -1,7 +1,6 @@
 #!/usr/bin/python3
 
 import socket
-import struct
 import time
 from datetime import datetime, timedelta, time as dt_time, date as dt_date
 import threading
@@ -10,23 +9,56 @@ import sys
 import statistics
 import json
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from concurrent.futures import ThreadPoolExecutor
 import subprocess
-from collections import deque
-import pandas as pd
-from scipy.signal import find_peaks
-
-import storeData as store_data
-import liveClassify as classifier
-import processData as data_processor
-from getCalendarData import get_calendar_data
-from fadeLights import fade_lights
+from contextlib import contextmanager
+
+from sleepCycles import SleepCycleTracker
+from hmmSmoother import OnlineViterbi, STATES, SLEEP_STATES
+from sleepSummary import SleepSummaryCache, TonightSleep
+from actionScheduler import ActionScheduler
+from alarmScheduler import AlarmScheduler
+from virtualClock import SystemClock
+from latencyStats import stage_timings, format_summary
+from metricsServer import MetricsWriter, start_metrics_server, resident_memory_bytes, udp_socket_drops
+from samplingProfiler import SamplingProfiler
+from packetFormat import parse_packet, SequenceTracker, SensorClock
+from liveCheckpoint import Checkpointer
 
 UDP_IP = "0.0.0.0"
 UDP_PORT = 5005
 PACKETS = 12
+BATCH_THRESHOLD = 50 * PACKETS
 BUFFER_SIZE = 4096
 HOURS_GOAL = 8.0
+CONFIRM_TICKS = 30
+FADE_TIMEOUT_MARGIN = 300
+DEFAULT_FIRST_EVENT_TIME = "10:00:00"
+LATENCY_SUMMARY_INTERVAL = 15 * 60
+# Everything submitted to action_scheduler, per bed.
+ACTION_TYPES = ("sleep_onset", "core_sleep", "fade_lights")
+# The raw store's tail only refills the signal buffer if it ends this close to now.
+REHYDRATE_MAX_AGE = 60
+# "systemd" rewrites alarm.timer/fade_lights.timer; "inprocess" fires them from this service.
+ALARM_BACKEND = os.environ.get("ALARM_BACKEND", "systemd")
+# Set to serve Prometheus metrics on 127.0.0.1:<port>; unset disables the endpoint.
+METRICS_PORT = os.environ.get("METRICS_PORT")
+EXPECTED_THREADS = ["receiver", "store-data", "switch-monitor", "classify", "registry-watcher", "calendar-prefetch", "latency-report"]
+# Multi-bed mode: comma-separated bed=source pairs, where source is the sender's
+# IP or "device:<id>" from the packet header, e.g. "left=192.168.1.40,right=device:2".
+BEDS = os.environ.get("BEDS", "")
+# Threads classifying beds in multi-bed mode; 0 means one per bed, up to the core count.
+CLASSIFY_WORKERS = int(os.environ.get("CLASSIFY_WORKERS", "0"))
+# Multi-bed mode keeps service-level events in Data/<night>-service/, so no bed may be called this.
+SERVICE_FOLDER = "service"
+
+# The pipeline modules pull in pandas, SciPy, sklearn and joblib, so they are
+# imported by load_pipeline_modules() once the receiver socket is already bound.
+store_data = None
+classifier = None
+data_processor = None
+pipeline_ready = threading.Event()
 
 def handle_sigterm(signum, frame):
     print("Service stopping?")
@@ -34,7 +66,83 @@ def handle_sigterm(signum, frame):
 
 signal.signal(signal.SIGTERM, handle_sigterm)
 
-dominant_history = deque(maxlen=1440)
+cycle_tracker = SleepCycleTracker()
+summary_cache = SleepSummaryCache()
+action_scheduler = ActionScheduler()
+alarm_lock = threading.Lock()
+# Every thread appends to the night's events file through the functions below.
+events_lock = threading.Lock()
+alarm_timers = None
+calendar_service = None
+calendar_lock = threading.Lock()
+tonight_sleep = TonightSleep()
+# Swapped for a VirtualClock by the night simulation.
+clock = SystemClock()
+# Only written by the receiver thread.
+receiver_stats = {"packets": 0, "samples": 0}
+sequence_tracker = SequenceTracker()
+sensor_clock = SensorClock()
+classification_monitor = None
+bed_pipelines = []
+# Source key -> BedPipeline, filled in by run_beds; the receiver holds packets until beds_ready is set.
+bed_sources = {}
+beds_ready = threading.Event()
+metrics_previous = {}
+service_started = time.monotonic()
+
+class StartupTimer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._phases = []
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, duration=0.0):
+        with self._lock:
+            self._phases.append((name, time.perf_counter() - self._start, duration))
+
+    def summary(self):
+        with self._lock:
+            return {
+                name: {"at": round(at, 3), "took": round(duration, 3)}
+                for name, at, duration in self._phases
+            }
+
+    def report(self):
+        print("Startup timing:")
+        for name, timing in self.summary().items():
+            print(f"  {name}: done at {timing['at']:.3f}s (took {timing['took']:.3f}s)")
+
+startup_timer = StartupTimer()
+
+def load_pipeline_modules():
+    global store_data, classifier, data_processor
+
+    with startup_timer.phase("import_pipeline"):
+        import storeData as store_data
+        import liveClassify as classifier
+        import processData as data_processor
+
+    pipeline_ready.set()
+
+def report_startup(night_context):
+    classifier.models_ready.wait()
+    startup_timer.record("models_loaded")
+    startup_timer.report()
+
+    save_event_to_json(
+        "startup_report",
+        datetime.now(),
+        file_path=f"Data/{night_context.night_id}/sleep_events-{night_context.night_id}.json",
+        details={"phases": startup_timer.summary()}
+    )
 
 @dataclass(frozen=True)
 class NightContext:
@@ -43,6 +151,7 @@ class NightContext:
     tomorrow: datetime
     night_id: str
     until: datetime
+    bed: str = None
 
 def build_night_context(cutoff, today):
     if today.time() < cutoff:
@@ -60,10 +169,13 @@ def build_night_context(cutoff, today):
     )
 
 class NightState:
-    def __init__(self, first_event_time):
+    def __init__(self, first_event_time, sleep=None, cycles=None):
         self._lock = threading.Lock()
         self._first_event_time = first_event_time
         self._alarm_scheduled = None
+        # Each bed brings its own trackers in multi-bed mode.
+        self.tonight_sleep = sleep if sleep is not None else tonight_sleep
+        self.cycle_tracker = cycles if cycles is not None else cycle_tracker
 
     def get_first_event_time(self):
         with self._lock:
@@ -81,32 +193,99 @@ class NightState:
         with self._lock:
             self._alarm_scheduled = value
 
-def parse_packet(data):
-    remainder = len(data) % 2
-    if remainder != 0:
-        data = data[:-remainder] 
-        
-    count = len(data) // 2
-    if count == 0:
-        return []
-        
-    return struct.unpack(f'<{count}h', data)
-
-def reciever(until=None, night_id=None):
+    def snapshot(self):
+        with self._lock:
+            return {"first_event_time": self._first_event_time, "alarm_scheduled": self._alarm_scheduled}
 
+    def restore(self, snapshot):
+        with self._lock:
+            self._first_event_time = snapshot["first_event_time"]
+            self._alarm_scheduled = snapshot["alarm_scheduled"]
+
+def parse_beds(text):
+    """BEDS as {source: bed}."""
+    beds = {}
+    for entry in text.split(","):
+        if not entry.strip():
+            continue
+        bed, _, source = (part.strip() for part in entry.partition("="))
+        # The bed name ends up in folder and file names.
+        if not source or not bed.replace("-", "").replace("_", "").isalnum() or bed == SERVICE_FOLDER:
+            raise ValueError(f"Bad BEDS entry: {entry!r}")
+        beds[source] = bed
+    return beds
+
+def source_key(addr, header):
+    if header is not None and header[3]:
+        return f"device:{header[3]}"
+    return addr[0]
+
+def bed_key(name, night_context):
+    # Timers and actions are named per bed so one bed's alarm never replaces another's.
+    if night_context is None or night_context.bed is None:
+        return name
+    return f"{name}-{night_context.bed}"
+
+def stamp_samples(header, adc_values, timestamp, tracker, sensor):
+    """(time, value) entries for one packet, or None if it is a duplicate or too stale to place."""
+    if header is None:
+        return [(timestamp, val) for val in adc_values]
+
+    sequence, counter, sample_rate, _ = header
+    status = tracker.update(sequence, counter, len(adc_values))
+    if status in ("duplicate", "stale"):
+        return None
+    if status == "reset":
+        print("Sensor counters restarted")
+        sensor.reset()
+
+    # Every sample gets its own time from the sensor's counter,
+    # so process_batch has nothing to redistribute.
+    return list(zip(sensor.timestamps(counter, len(adc_values), sample_rate, timestamp), adc_values))
+
+def bind_receiver():
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.settimeout(1.0)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 2*1024*1024)
     sock.bind((UDP_IP, UDP_PORT))
+    return sock
+
+def process_accumulated(local_accumulator, night_id=None, live_buffer=None):
+    # The oldest entry has waited longest for its batch to fill.
+    stage_timings.record("receive", clock.time() - local_accumulator[0][0])
+    batch_start = time.perf_counter()
+
+    try:
+        processed_df = data_processor.process_batch(local_accumulator)
+        stage_timings.record("batch_processing", time.perf_counter() - batch_start)
+
+        if processed_df is not None and not processed_df.empty:
+            (live_buffer if live_buffer is not None else classifier.live_buffer).add_batch(processed_df)
+
+    except Exception as e:
+        print(f"Error processing batch: {e}")
+        if night_id:
+            log_error_to_json(
+                f"Error processing batch: {e}",
+                file_path=f"Data/{night_id}/sleep_events-{night_id}.json"
+            )
+
+    local_accumulator.clear()
+
+def reciever(until=None, night_id=None, sock=None):
+
+    if sock is None:
+        sock = bind_receiver()
     
-    print(f"Listening on {UDP_IP}:{UDP_PORT}...")
+    host, port = sock.getsockname()
+    print(f"Listening on {host}:{port}...")
     first_packet = True
 
     local_accumulator = []
-    BATCH_THRESHOLD = 50 * PACKETS
+    pending_store = []
 
     try:
-        while until is None or datetime.now() < until:
+        while until is None or clock.now() < until:
             try:
                 data, addr = sock.recvfrom(BUFFER_SIZE)
 
@@ -116,56 +295,64 @@ def reciever(until=None, night_id=None):
                     if night_id:
                         save_event_to_json(
                             "receiver_first_packet",
-                            datetime.now(),
+                            clock.now(),
                             file_path=f"Data/{night_id}/sleep_events-{night_id}.json"
                         )
                 
-                timestamp = time.time()
-                adc_values = parse_packet(data)
+                timestamp = clock.time()
+                header, adc_values = parse_packet(data)
                 
                 if not adc_values:
                     continue
 
-                new_entries = [(timestamp, val) for val in adc_values]
+                new_entries = stamp_samples(header, adc_values, timestamp, sequence_tracker, sensor_clock)
+                if new_entries is None:
+                    continue
+
+                receiver_stats["packets"] += 1
+                receiver_stats["samples"] += len(adc_values)
                 
                 local_accumulator.extend(new_entries)
+                pending_store.extend(new_entries)
+
+                # Packets that arrive while the pipeline is still importing are held here.
+                if not pipeline_ready.is_set():
+                    continue
 
-                with store_data.write_lock:
-                    store_data.write_queue.extend(new_entries)
+                store_data.write_queue.put(pending_store)
+                pending_store.clear()
 
                 if len(local_accumulator) >= BATCH_THRESHOLD:
-                    
-                    try:
-                        processed_df = data_processor.process_batch(local_accumulator)
- 
-                        if processed_df is not None and not processed_df.empty:
-                            classifier.live_buffer.add_batch(processed_df)
-                            
-                    except Exception as e:
-                        print(f"Error processing batch: {e}")
-                        if night_id:
-                            log_error_to_json(
-                                f"Error processing batch: {e}",
-                                file_path=f"Data/{night_id}/sleep_events-{night_id}.json"
-                            )
-
-                    local_accumulator.clear()
+                    process_accumulated(local_accumulator, night_id)
 
             except socket.timeout:
                 if not first_packet: print("No data...")
                 continue
+            except Exception as e:
+                # One bad packet must not stop recording for the rest of the night.
+                print(f"Receiver error: {e}")
+                continue
 
     except KeyboardInterrupt:
         print("Stopping...")
         sock.close()
 
-from datetime import datetime, date as dt_date, timedelta
+    if sequence_tracker.packets:
+        report = sequence_tracker.report()
+        print(f"Packet report: {report}")
+        if night_id:
+            save_event_to_json(
+                "packet_report",
+                clock.now(),
+                file_path=f"Data/{night_id}/sleep_events-{night_id}.json",
+                details=report
+            )
 
 def schedule_alarm(alarm_time, date=None, night_context=None, night_state=None):
     if isinstance(alarm_time, str):
         alarm_time = datetime.strptime(alarm_time, "%H:%M:%S").time()
 
-    now = datetime.now()
+    now = clock.now()
 
     if date is not None:
         if isinstance(date, str):
@@ -183,31 +370,57 @@ def schedule_alarm(alarm_time, date=None, night_context=None, night_state=None):
 
         date_str = "*-*-*"
 
-    delta = alarm_dt - datetime.now()
+    delta = alarm_dt - clock.now()
     mins_until = int(delta.total_seconds() / 60)
 
     if 0 <= mins_until <= 30:
         print("Alarm is within 30 minutes, doing alternate behaviour")
-        with open("skipnextalarm", "w") as f:
-            pass
-        with open("skipnextfadelights", "w") as f:
-            pass
+        if ALARM_BACKEND == "inprocess":
+            get_alarm_timers().cancel(bed_key("alarm", night_context))
+            get_alarm_timers().cancel(bed_key("fade_lights", night_context))
+        else:
+            with open("skipnextalarm", "w") as f:
+                pass
+            with open("skipnextfadelights", "w") as f:
+                pass
         seconds_left = mins_until * 60
         steps = max(1, min(seconds_left // 2, 255))
-        threading.Thread(
-            target=fade_lights,
+        action_scheduler.submit(
+            bed_key("fade_lights", night_context),
+            fire_fade_lights,
             kwargs={
                 "duration": seconds_left,
                 "steps": steps,
                 "aware": False,
                 "alarm_mode": True
-            }
-        ).start()
+            },
+            timeout=seconds_left + FADE_TIMEOUT_MARGIN
+        )
         return
 
     fade_dt = alarm_dt - timedelta(minutes=30)
 
-    if date is not None:
+    if ALARM_BACKEND == "inprocess":
+        timers = get_alarm_timers()
+        with alarm_lock:
+            timers.schedule(bed_key("fade_lights", night_context), fade_dt)
+            timers.schedule(bed_key("alarm", night_context), alarm_dt)
+
+            if night_state:
+                night_state.set_alarm_scheduled(alarm_dt)
+    else:
+        apply_systemd_timers(alarm_dt, alarm_time, date_str, fade_dt, date is not None, night_state)
+
+    if night_context:
+        (night_state.tonight_sleep if night_state else tonight_sleep).record_event("alarm_set", alarm_dt)
+        update_event_in_json(
+            "alarm_set",
+            alarm_dt,
+            file_path=f"Data/{night_context.night_id}/sleep_events-{night_context.night_id}.json",
+        )
+
+def apply_systemd_timers(alarm_dt, alarm_time, date_str, fade_dt, dated, night_state=None):
+    if dated:
         fade_date_str = fade_dt.date().strftime('%Y-%m-%d')
     else:
         # recurring timer: only care about the time; date is wildcard
@@ -235,25 +448,54 @@ OnCalendar={fade_date_str} {fade_time.strftime('%H:%M:%S')}
 WantedBy=timers.target"""
 
     # ---- Apply timers ----
-    subprocess.run(["sudo", "/usr/local/bin/update_alarm_timer", new_contents])
-    subprocess.run(["sudo", "/usr/local/bin/update_fade_lights_timer", new_fade_lights_contents])
-    subprocess.run(["sudo", "systemctl", "daemon-reload"])
-    subprocess.run(["sudo", "systemctl", "restart", "alarm.timer"])
-    subprocess.run(["sudo", "systemctl", "restart", "fade_lights.timer"])
+    # sleep_onset and core_sleep actions may run side by side, so the rewrite is serialised.
+    with alarm_lock:
+        subprocess.run(["sudo", "/usr/local/bin/update_alarm_timer", new_contents])
+        subprocess.run(["sudo", "/usr/local/bin/update_fade_lights_timer", new_fade_lights_contents])
+        subprocess.run(["sudo", "systemctl", "daemon-reload"])
+        subprocess.run(["sudo", "systemctl", "restart", "alarm.timer"])
+        subprocess.run(["sudo", "systemctl", "restart", "fade_lights.timer"])
+
+        if night_state:
+            night_state.set_alarm_scheduled(alarm_dt)
+
+def fire_fade_lights(**kwargs):
+    from fadeLights import fade_lights
+    fade_lights(**kwargs)
+
+def fire_alarm():
+    from Alarm import run_active_alarm
+    run_active_alarm()
+
+def get_alarm_timers():
+    global alarm_timers
+
+    with alarm_lock:
+        if alarm_timers is None:
+            actions = {
+                "fade_lights": fire_fade_lights,
+                "alarm": fire_alarm
+            }
+            for bed in set(parse_beds(BEDS).values()):
+                actions[f"fade_lights-{bed}"] = fire_fade_lights
+                actions[f"alarm-{bed}"] = fire_alarm
+            alarm_timers = AlarmScheduler(actions)
+        return alarm_timers
 
-    if night_state:
-        night_state.set_alarm_scheduled(alarm_dt)
+def get_calendar_service():
+    global calendar_service
 
-    if night_context:
-        update_event_in_json(
-            "alarm_set",
-            alarm_dt,
-            file_path=f"Data/{night_context.night_id}/sleep_events-{night_context.night_id}.json",
-        )
+    with calendar_lock:
+        if calendar_service is None:
+            from getCalendarData import CalendarService
+            calendar_service = CalendarService()
+        return calendar_service
 
+def return_first_event_time(search_date, block=True):
+    events = get_calendar_service().get_events(search_date, block=block)
 
-def return_first_event_time(search_date):
-    events = get_calendar_data(search_date)
+    if events is None:
+        return None
 
     events = sorted(events, key=lambda x: x['time'])
 
@@ -263,7 +505,7 @@ def return_first_event_time(search_date):
     ]
 
     if not events:
-        return datetime.strptime("10:00:00", "%H:%M:%S").time()
+        return datetime.strptime(DEFAULT_FIRST_EVENT_TIME, "%H:%M:%S").time()
 
     event_time = datetime.combine(datetime.today(), events[0]['time'])
 
@@ -271,58 +513,24 @@ def return_first_event_time(search_date):
 
     return first_event.time()
 
-def calculate_sleep_time(json_path):
-    with open(json_path, 'r') as f:
-        events = json.load(f)
-
-    for e in events:
-        e["timestamp"] = datetime.strptime(e["timestamp"], "%Y-%m-%d %H:%M:%S")
-    events.sort(key=lambda x: x["timestamp"])
-
-    sleep_periods = []
-    last_sleep_onset = None
-
-    for event in events:
-        if event["type"] == "sleep_onset":
-            last_sleep_onset = event["timestamp"]
-
-        elif event["type"] == "wake_up" and last_sleep_onset:
-            sleep_periods.append((last_sleep_onset, event["timestamp"]))
-            last_sleep_onset = None
-
-        elif event["type"] == "alarm_set":
-            if last_sleep_onset:
-                sleep_periods.append((last_sleep_onset, event["timestamp"]))
-                last_sleep_onset = None
-
-    total_sleep_seconds = sum((end - start).total_seconds() for start, end in sleep_periods)
-    total_sleep_hours = total_sleep_seconds / 3600
-
-    return total_sleep_hours
-
 def calculate_sleep_debt(night_context, past_days=7):
-    search_dates = list([(night_context.today - timedelta(days=i)).strftime("%d%m%y") for i in range(1, past_days + 1)])
-    print(search_dates)
-    search_paths = list([f"Data/{night_id}/sleep_events-{night_id}.json" for night_id in search_dates])
-    print(search_paths)
-    sleep_hours = []
-    for search_path in search_paths:
-        if os.path.exists(search_path):
-            hours = calculate_sleep_time(search_path)
-            sleep_hours.append(hours)
-
-    return sum(HOURS_GOAL - x for x in sleep_hours)
+    suffix = f"-{night_context.bed}" if night_context.bed else ""
+    return summary_cache.sleep_debt(night_context.today, HOURS_GOAL, past_days, suffix)
 
 def sleep_onset_action(night_context, night_state, timestamp):
+    action_start = time.perf_counter()
     try:
-        new_first_event_time = return_first_event_time(night_context.tomorrow.replace(hour=00, minute=00, second=0, microsecond=0))
+        # Served from the calendar cache; a stale entry is refreshed in the background.
+        new_first_event_time = return_first_event_time(
+            night_context.tomorrow.replace(hour=00, minute=00, second=0, microsecond=0),
+            block=False
+        )
+        if new_first_event_time is None:
+            new_first_event_time = night_state.get_first_event_time()
 
         sleep_debt = calculate_sleep_debt(night_context)
         search_path = f"Data/{night_context.night_id}/sleep_events-{night_context.night_id}.json"
-        if os.path.exists(search_path):
-            slept_today = calculate_sleep_time(search_path)
-        else:
-            slept_today = 0.0
+        slept_today = night_state.tonight_sleep.hours()
         hours = HOURS_GOAL - slept_today + sleep_debt
         wake_today = timestamp + timedelta(hours=hours)
 
@@ -338,33 +546,49 @@ def sleep_onset_action(night_context, night_state, timestamp):
             print(f"Updating first event time to {new_first_event_time.strftime('%H:%M:%S')}")
             night_state.set_first_event_time(new_first_event_time)
             schedule_alarm(new_first_event_time.strftime("%H:%M:%S"), night_context=night_context, night_state=night_state)
+            stage_timings.record("onset_to_alarm", (clock.now() - timestamp).total_seconds())
+
+        stage_timings.record("onset_action", time.perf_counter() - action_start)
     except Exception as e:
         log_error_to_json(
             f"sleep_onset_action crashed: {e}",
             file_path=f"Data/{night_context.night_id}/sleep_events-{night_context.night_id}.json"
         )
 
-def save_event_to_json(event_type, timestamp, file_path="sleep_events.json"):
+def read_events(file_path):
+    if not os.path.exists(file_path):
+        return []
+
+    try:
+        with open(file_path, "r") as f:
+            return json.load(f)
+    except json.JSONDecodeError as e:
+        # Keep the unreadable file for inspection rather than overwriting the night's events with one record.
+        aside_path = f"{file_path}.corrupt-{datetime.now().strftime('%H%M%S')}"
+        os.replace(file_path, aside_path)
+        print(f"Unreadable events file {file_path} ({e}), moved to {aside_path}")
+        return []
+
+def write_events(file_path, data):
+    temp_path = file_path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f, indent=4)
+    os.replace(temp_path, file_path)
+
+def save_event_to_json(event_type, timestamp, file_path="sleep_events.json", details=None):
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
     event_record = {
         "type": event_type,
         "timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S")
     }
-    
-    if os.path.exists(file_path):
-        with open(file_path, "r") as f:
-            try:
-                data = json.load(f)
-            except json.JSONDecodeError:
-                data = []
-    else:
-        data = []
-        
-    data.append(event_record)
-    
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=4)
+    if details:
+        event_record.update(details)
+
+    with events_lock:
+        data = read_events(file_path)
+        data.append(event_record)
+        write_events(file_path, data)
 
 def update_event_in_json(event_type, timestamp, file_path="sleep_events.json"):
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
@@ -373,138 +597,76 @@ def update_event_in_json(event_type, timestamp, file_path="sleep_events.json"):
         "type": event_type,
         "timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S")
     }
-    
-    # Load existing data
-    if os.path.exists(file_path):
-        with open(file_path, "r") as f:
-            try:
-                data = json.load(f)
-            except json.JSONDecodeError:
-                data = []
-    else:
-        data = []
-
-    # Look for an existing event with same type
-    updated = False
-    for i, event in enumerate(data):
-        if event.get("type") == event_type:
-            data[i] = event_record  # overwrite existing record
-            updated = True
-            break
-
-    # If no existing event was updated, append a new one
-    if not updated:
-        data.append(event_record)
 
-    # Save back to file
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=4)
+    with events_lock:
+        data = read_events(file_path)
+
+        # Look for an existing event with same type
+        updated = False
+        for i, event in enumerate(data):
+            if event.get("type") == event_type:
+                data[i] = event_record  # overwrite existing record
+                updated = True
+                break
+
+        # If no existing event was updated, append a new one
+        if not updated:
+            data.append(event_record)
+
+        write_events(file_path, data)
 
 def log_error_to_json(message, file_path):
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
     event_record = {
         "type": "error",
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "timestamp": clock.now().strftime("%Y-%m-%d %H:%M:%S"),
         "message": str(message)
     }
 
-    if os.path.exists(file_path):
-        try:
-            with open(file_path, "r") as f:
-                data = json.load(f)
-        except json.JSONDecodeError:
-            data = []
-    else:
-        data = []
-
-    data.append(event_record)
-
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=4)
+    with events_lock:
+        data = read_events(file_path)
+        data.append(event_record)
+        write_events(file_path, data)
 
 def core_sleep_action(night_context, night_state):
+    cycle_tracker = night_state.cycle_tracker
     try:
-        history = list(dominant_history)
-        if not history:
+        if not cycle_tracker.has_history():
             save_event_to_json(
                 "no_history_for_core_sleep",
-                datetime.now(),
+                clock.now(),
                 file_path=f"Data/{night_context.night_id}/sleep_events-{night_context.night_id}.json",
             )
             return
 
-        df = pd.DataFrame(history)
-
-        df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
-
-        # Drop rows where timestamp conversion failed
-        df = df.dropna(subset=['timestamp'])
-
-        # Create a core indicator
-        df['is_core'] = df['state'].str.lower().str.contains('core').astype(int)
-
-        df = df.set_index('timestamp').sort_index()
-        sample_check = df['is_core'].resample('1min').max().fillna(0)
-
-        WINDOW_SIZE = '20min' 
-        smooth_signal = sample_check.rolling(window=WINDOW_SIZE, center=True).mean()
-
-        peaks_indices, _ = find_peaks(
-            smooth_signal.values, 
-            distance=70,       # Minimum distance between peaks (in minutes)
-            height=0.4,        # Intensity threshold (0.4 means 40% of the window was 'core')
-            prominence=0.1     # Peak must stand out relative to neighbors
-        )
-
-        peak_times = smooth_signal.index[peaks_indices]
-        intervals = pd.Series(peak_times).diff().dropna()
-
-        if len(peak_times) < 2 or intervals.empty:
+        if len(cycle_tracker.peak_times()) < 2:
             print("No core sleep peaks detected for core sleep action.")
             save_event_to_json(
                 "no_core_peaks_detected",
-                datetime.now(),
+                clock.now(),
                 file_path=f"Data/{night_context.night_id}/sleep_events-{night_context.night_id}.json",
             )
             return
-    
-        intervals_mins = intervals.dt.total_seconds() / 60
-        
-        valid_cycles = intervals_mins[(intervals_mins >= 70) & (intervals_mins <= 120)]
 
-        if valid_cycles.empty:
+        next_prediction = cycle_tracker.next_predicted_peak()
+
+        if next_prediction is None:
             # no valid cycles at all
             print("No valid core sleep cycles found; skipping core sleep adjustment.")
             save_event_to_json(
                 "no_valid_core_cycles",
-                datetime.now(),
-                file_path=f"Data/{night_context.night_id}/sleep_events-{night_context.night_id}.json",
-            )
-            return
-
-        avg_cycle = valid_cycles.median()
-
-        if pd.isna(avg_cycle):
-            print("Average cycle is NaN; skipping core sleep adjustment.")
-            save_event_to_json(
-                "average_cycle_is_NaN",
-                datetime.now(),
+                clock.now(),
                 file_path=f"Data/{night_context.night_id}/sleep_events-{night_context.night_id}.json",
             )
             return
 
-        last_peak = peak_times[-1]
-
-        next_prediction = last_peak + pd.Timedelta(minutes=avg_cycle)
-
         alarm_dt = night_state.get_alarm_scheduled()
         if alarm_dt is not None and next_prediction <= alarm_dt <= next_prediction + timedelta(minutes=30):
-        # if next_prediction <= night_state.get_alarm_scheduled() <= next_prediction + timedelta(minutes=30):
             print(f"Adjusting alarm to core sleep peak at {next_prediction.strftime('%H:%M:%S')}")
             save_event_to_json(
                 "core_sleep_alarm_set: " + next_prediction.strftime('%H:%M:%S'),
-                datetime.now(),
+                clock.now(),
                 file_path=f"Data/{night_context.night_id}/sleep_events-{night_context.night_id}.json",
             )
             schedule_alarm(
@@ -520,104 +682,631 @@ def core_sleep_action(night_context, night_state):
         )
         return
 
-def monitor_classification_history(night_context, night_state):
+class ClassificationMonitor:
+    """Turns the classifier's 2 s results into confirmed sleep/wake events, cycle history and core-sleep alarm checks."""
+
+    def __init__(self, night_context, night_state):
+        self.night_context = night_context
+        self.night_state = night_state
+        self.smoother = OnlineViterbi()
+        self.minute_states = []
+        self.asleep = False
+        self.pending_since = None
+        self.pending_ticks = 0
+        self.actioned_core = False
+        self.actioned_prediction = None
+        self.current_state = None
+        self.resumed = False
+        self.classified = False
+
+    def snapshot(self):
+        return {
+            "smoother": self.smoother.snapshot(),
+            "minute_states": list(self.minute_states),
+            "asleep": self.asleep,
+            "pending_since": self.pending_since,
+            "pending_ticks": self.pending_ticks,
+            "actioned_core": self.actioned_core,
+            "actioned_prediction": self.actioned_prediction,
+            "current_state": self.current_state
+        }
+
+    def restore(self, snapshot):
+        self.smoother.restore(snapshot["smoother"])
+        self.minute_states = list(snapshot["minute_states"])
+        self.asleep = snapshot["asleep"]
+        self.pending_since = snapshot["pending_since"]
+        self.pending_ticks = snapshot["pending_ticks"]
+        self.actioned_core = snapshot["actioned_core"]
+        self.actioned_prediction = snapshot["actioned_prediction"]
+        self.current_state = snapshot["current_state"]
+        self.resumed = True
+
+    def process(self, timestamp, state, sample_time=None):
+        night_context = self.night_context
+        night_state = self.night_state
+        stage_timings.record("monitor", (clock.now() - timestamp).total_seconds())
+
+        if not self.classified:
+            self.classified = True
+            startup_timer.record(bed_key("first_classification", night_context))
+            save_event_to_json(
+                "first_classification",
+                timestamp,
+                file_path=f"Data/{night_context.night_id}/sleep_events-{night_context.night_id}.json",
+                details={"after_seconds": round(time.monotonic() - service_started, 3), "resumed": self.resumed}
+            )
+
+        smoothed = self.smoother.update(timestamp, state)
+        if smoothed is None:
+            return
+
+        current_time, current_state = smoothed
+        self.current_state = current_state
+        stage_timings.record("smoothing", (timestamp - current_time).total_seconds())
+        self.minute_states.append(current_state)
+
+        # A sleep/wake change must hold for CONFIRM_TICKS smoothed ticks
+        # and is stamped with the first tick of the run.
+        if (current_state in SLEEP_STATES) != self.asleep:
+            if self.pending_since is None:
+                self.pending_since, self.pending_ticks = current_time, 0
+            self.pending_ticks += 1
+        else:
+            self.pending_since = None
+
+        if self.pending_since is not None and self.pending_ticks >= CONFIRM_TICKS:
+            pending_since = self.pending_since
+            stage_timings.record("detection", (clock.now() - pending_since).total_seconds())
+            write_start = time.perf_counter()
+            if not self.asleep:
+                print(f"CONFIRMED SLEEP ONSET: {pending_since.strftime('%H:%M:%S')}")
+                night_state.tonight_sleep.record_event("sleep_onset", pending_since)
+                save_event_to_json("sleep_onset", pending_since, file_path=f"Data/{night_context.night_id}/sleep_events-{night_context.night_id}.json")
+                stage_timings.record("event_write", time.perf_counter() - write_start)
+                action_scheduler.submit(
+                    bed_key("sleep_onset", night_context),
+                    sleep_onset_action,
+                    args=(night_context, night_state, pending_since)
+                )
+                self.asleep = True
+            else:
+                print(f"CONFIRMED WAKE UP: {pending_since.strftime('%H:%M:%S')}")
+                night_state.tonight_sleep.record_event("wake_up", pending_since)
+                save_event_to_json("wake_up", pending_since, file_path=f"Data/{night_context.night_id}/sleep_events-{night_context.night_id}.json")
+                stage_timings.record("event_write", time.perf_counter() - write_start)
+                self.asleep = False
+            if sample_time is not None:
+                stage_timings.record("sample_to_event", clock.time() - sample_time)
+            self.pending_since = None
+
+        if len(self.minute_states) < 30:
+            return
+
+        night_state.cycle_tracker.add_state(current_time, statistics.mode(self.minute_states))
+        self.minute_states.clear()
+
+        # Re-evaluated every minute in the hour before the alarm, but only
+        # acted on when the predicted core peak actually moves.
+        alarm_dt = night_state.get_alarm_scheduled()
+        if alarm_dt is not None and current_time <= alarm_dt <= current_time + timedelta(minutes=60):
+            next_prediction = night_state.cycle_tracker.next_predicted_peak()
+            if not self.actioned_core or (next_prediction is not None and next_prediction != self.actioned_prediction):
+                action_scheduler.submit(
+                    bed_key("core_sleep", night_context),
+                    core_sleep_action,
+                    args=(night_context, night_state)
+                )
+                self.actioned_core = True
+                self.actioned_prediction = next_prediction
+
+def monitor_classification_history(night_context, night_state, monitor=None, checkpointer=None):
+    global classification_monitor
     print("Sleep Tracker Monitor Started...")
-    dominant_buffer = classifier.HistoryBuffer(max_length=15)
-    asleep = False
-    actionedCore = False
+    if monitor is None:
+        monitor = ClassificationMonitor(night_context, night_state)
+    classification_monitor = monitor
     while True:
         try:
-            if len(classifier.classify_history_buffer.get_data()) < 30:
-                time.sleep(1)
-                continue
-            
-            sleep_data = classifier.classify_history_buffer.get_data()
-            classifier.classify_history_buffer.clear_data()
-
-            sleep_states = [state for _, state in sleep_data]
-            timestamps = [time for time, _ in sleep_data]
-
-            minute_state = statistics.mode(sleep_states)
-            dominant_buffer.add_data(minute_state)
-            dominant_history.append({
-                "timestamp": datetime.now(),
-                "state": minute_state
-            })
-
-            if len(dominant_buffer.get_data()) >= 15:
-                recent_states = dominant_buffer.get_data()
-                sleep_count = sum(1 for state in recent_states if state in ["Core Sleep", "Deep Sleep", "REM Sleep"])
-                density = sleep_count / len(recent_states)
-
-                current_time = timestamps[-1]
-
-                if density >= 0.75 and not asleep:
-                    print(f"CONFIRMED SLEEP ONSET: {current_time.strftime('%H:%M:%S')}")
-                    save_event_to_json("sleep_onset", current_time, file_path=f"Data/{night_context.night_id}/sleep_events-{night_context.night_id}.json")
-                    threading.Thread(
-                        target=sleep_onset_action,
-                        args=(night_context, night_state, current_time),
-                        daemon=True
-                    ).start()
-                    asleep = True
-                elif density < 0.40 and asleep:
-                    print(f"CONFIRMED WAKE UP: {current_time.strftime('%H:%M:%S')}")
-                    save_event_to_json("wake_up", current_time, file_path=f"Data/{night_context.night_id}/sleep_events-{night_context.night_id}.json")
-                    asleep = False
-                
-                alarm_dt = night_state.get_alarm_scheduled()
-                if alarm_dt is not None and current_time <= alarm_dt <= current_time + timedelta(minutes=60) and not actionedCore:
-                # if current_time <= night_state.get_alarm_scheduled() <= current_time + timedelta(minutes=60) and not actionedCore:
-                    threading.Thread(
-                        target=core_sleep_action,
-                        args=(night_context, night_state),
-                        daemon=True
-                    ).start()
-                    actionedCore = True
+            results = classifier.classification_channel.drain(timeout=60)
+
+            for result in results:
+                monitor.process(*result)
+            checkpoint_if_due(checkpointer, monitor, classifier.history_buffer)
         except Exception as e:
             log_error_to_json(
                 f"monitor_classification_history error: {e}",
                 file_path=f"Data/{night_context.night_id}/sleep_events-{night_context.night_id}.json"
             )
             time.sleep(1)
+
+def capture_state(monitor, history_buffer):
+    night_state = monitor.night_state
+    return {
+        "monitor": monitor.snapshot(),
+        "night_state": night_state.snapshot(),
+        "cycle_tracker": night_state.cycle_tracker.snapshot(),
+        "history": history_buffer.get_data()
+    }
+
+def restore_state(state, monitor, history_buffer):
+    night_state = monitor.night_state
+    monitor.restore(state["monitor"])
+    night_state.restore(state["night_state"])
+    night_state.cycle_tracker.restore(state["cycle_tracker"])
+
+    history_buffer.clear_data()
+    for row in state["history"]:
+        history_buffer.add_data(row)
+
+def checkpoint_if_due(checkpointer, monitor, history_buffer):
+    # Called from whichever thread drives the monitor, so its state is never read mid-update.
+    if checkpointer is None or not checkpointer.due():
+        return
+
+    start = time.perf_counter()
+    try:
+        checkpointer.write(capture_state(monitor, history_buffer))
+        stage_timings.record("checkpoint", time.perf_counter() - start)
+    except Exception as e:
+        log_error_to_json(
+            f"Checkpoint write failed: {e}",
+            file_path=f"Data/{monitor.night_context.night_id}/sleep_events-{monitor.night_context.night_id}.json"
+        )
+
+def warm_start(monitor, history_buffer, live_buffer, checkpointer):
+    """Picks a night back up after a restart: restores its last checkpoint and refills the signal buffer from the raw store.
+
+    Returns True if a checkpoint was restored. Either part on its own
+    still helps: the checkpoint brings back the smoother, sleep/wake
+    state, cycle history and scheduled alarm, and the raw store's tail
+    lets the first tick classify without waiting 30 s for new samples.
+    """
+    night_id = monitor.night_context.night_id
+    events_file = f"Data/{night_id}/sleep_events-{night_id}.json"
+    details = {}
+
+    loaded = checkpointer.read()
+    if loaded is not None:
+        state, age = loaded
+        try:
+            restore_state(state, monitor, history_buffer)
+            details["checkpoint_age"] = round(age, 1)
+            details["asleep"] = monitor.asleep
+        except Exception as e:
+            log_error_to_json(f"Checkpoint restore failed: {e}", file_path=events_file)
+
+    try:
+        tail = store_data.read_raw_tail(night_id, live_buffer.max_len)
+        if tail is not None and not tail.empty:
+            tail_age = clock.time() - tail['datetime'].iloc[-1].timestamp()
+            if tail_age <= REHYDRATE_MAX_AGE:
+                live_buffer.prefill(tail)
+                details["rehydrated_samples"] = len(tail)
+                details["tail_age"] = round(tail_age, 1)
+    except Exception as e:
+        log_error_to_json(f"Raw store rehydration failed: {e}", file_path=events_file)
+
+    if details:
+        print(f"Warm start: {details}")
+        save_event_to_json("warm_start", clock.now(), file_path=events_file, details=details)
+
+    return "checkpoint_age" in details
             
+class BedPipeline:
+    """One bed in multi-bed mode: its own packet tracking, buffers, classifier state, night folder, monitor and alarm.
+
+    receive() is called from the receiver thread and classify() from the
+    classify pool, never twice at once for the same bed. The models are
+    not copied: every bed classifies with liveClassify's active model set.
+    """
+
+    def __init__(self, bed, night_context, first_event_time):
+        night_id = night_context.night_id
+        self.bed = bed
+        self.night_context = night_context
+        self.first_event_time = first_event_time
+        self.events_file = f"Data/{night_id}/sleep_events-{night_id}.json"
+        self.night_state = NightState(first_event_time, sleep=TonightSleep(), cycles=SleepCycleTracker())
+        self.classifier_state = classifier.BedClassifier()
+        self.monitor = ClassificationMonitor(night_context, self.night_state)
+        self.checkpointer = Checkpointer(night_id)
+        self.write_queue = store_data.IngestQueue(spill_path=f"Data/{night_id}/spill-{night_id}.bin")
+        self.sequence_tracker = SequenceTracker()
+        self.sensor_clock = SensorClock()
+        # Only written by the receiver thread.
+        self.stats = {"packets": 0, "samples": 0}
+        self.accumulator = []
+        self.tick = None
+        self.resumed = False
+
+    def start(self):
+        night_id = self.night_context.night_id
+        os.makedirs(f"Data/{night_id}", exist_ok=True)
+        save_event_to_json("service_started", clock.now(), file_path=self.events_file)
+        self.night_state.tonight_sleep.load(self.events_file)
+
+        threading.Thread(
+            target=store_data.store_data,
+            args=(night_id, self.night_context.until, self.write_queue),
+            name=f"store-{self.bed}",
+            daemon=True
+        ).start()
+
+        self.resumed = warm_start(self.monitor, self.classifier_state.history_buffer, self.classifier_state.live_buffer, self.checkpointer)
+
+    def schedule(self):
+        """The bed's startup alarm actions, run once the receiver is delivering its packets."""
+        if self.resumed and self.night_state.get_alarm_scheduled() is not None:
+            print(f"Bed {self.bed} resumed with alarm at {self.night_state.get_alarm_scheduled()}")
+            return
+
+        sleep_onset_action(self.night_context, self.night_state, clock.now())
+        schedule_alarm(self.first_event_time.strftime("%H:%M:%S"), night_context=self.night_context, night_state=self.night_state)
+
+    def receive(self, header, adc_values, timestamp):
+        """Returns False for a duplicate packet."""
+        new_entries = stamp_samples(header, adc_values, timestamp, self.sequence_tracker, self.sensor_clock)
+        if new_entries is None:
+            return False
+
+        if self.stats["packets"] == 0:
+            print(f"First packet for bed {self.bed}")
+            save_event_to_json("receiver_first_packet", clock.now(), file_path=self.events_file)
+
+        self.stats["packets"] += 1
+        self.stats["samples"] += len(adc_values)
+
+        self.write_queue.put(new_entries)
+        self.accumulator.extend(new_entries)
+        if len(self.accumulator) >= BATCH_THRESHOLD:
+            process_accumulated(self.accumulator, self.night_context.night_id, self.classifier_state.live_buffer)
+        return True
+
+    def classify(self, models):
+        try:
+            classifier.classify_tick(models, self.night_context.night_id, self.classifier_state)
+            for result in self.classifier_state.classification_channel.drain(timeout=0):
+                self.monitor.process(*result)
+            checkpoint_if_due(self.checkpointer, self.monitor, self.classifier_state.history_buffer)
+        except Exception as e:
+            log_error_to_json(f"Bed {self.bed} classification error: {e}", file_path=self.events_file)
+
+    def summary(self):
+        summary = {"ingest": self.write_queue.stats()}
+        if self.sequence_tracker.packets:
+            summary["packets"] = self.sequence_tracker.report()
+        return summary
+
+def route_packets(beds, until, sock):
+    """Multi-bed receiver: hands each packet to the bed its sender or device id maps to.
+
+    Started right after the socket is bound. Until run_beds has built the
+    bed pipelines, packets are held per source and delivered in order
+    once they exist.
+    """
+    host, port = sock.getsockname()
+    print(f"Listening on {host}:{port} for {len(set(beds.values()))} beds...")
+    unknown = set()
+    held = {}
+
+    try:
+        while clock.now() < until:
+            try:
+                data, addr = sock.recvfrom(BUFFER_SIZE)
+            except socket.timeout:
+                continue
+
+            try:
+                timestamp = clock.time()
+                header, adc_values = parse_packet(data)
+                if not adc_values:
+                    continue
+
+                key = source_key(addr, header)
+                if key not in beds:
+                    if key not in unknown:
+                        print(f"Ignoring packets from {key}: not in BEDS")
+                        unknown.add(key)
+                    continue
+
+                if not beds_ready.is_set():
+                    held.setdefault(key, []).append((header, adc_values, timestamp))
+                    continue
+
+                if held:
+                    for held_key, packets in held.items():
+                        for packet in packets:
+                            deliver_packet(bed_sources[held_key], *packet)
+                    held.clear()
+
+                deliver_packet(bed_sources[key], header, adc_values, timestamp)
+            except Exception as e:
+                # One bad packet must not stop recording for every bed.
+                print(f"Receiver error from {addr[0]}: {e}")
+
+    except KeyboardInterrupt:
+        print("Stopping...")
+        sock.close()
+
+    for pipeline in bed_pipelines:
+        if pipeline.sequence_tracker.packets:
+            save_event_to_json("packet_report", clock.now(), file_path=pipeline.events_file, details=pipeline.sequence_tracker.report())
+
+def deliver_packet(pipeline, header, adc_values, timestamp):
+    if pipeline.receive(header, adc_values, timestamp):
+        receiver_stats["packets"] += 1
+        receiver_stats["samples"] += len(adc_values)
+
+def classify_beds(pipelines, until):
+    workers = CLASSIFY_WORKERS or min(len(pipelines), os.cpu_count() or 1)
+    print(f"Classification worker started for {len(pipelines)} beds on {workers} threads")
+
+    # The heavy parts of a tick (SciPy filtering, FFTs, tree prediction) run
+    # in native code, so ticks for different beds overlap on separate cores.
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="classify-worker") as pool:
+        while clock.now() < until:
+            clock.sleep(classifier.ML_INTERVAL)
+
+            models = classifier.get_active_models()
+            if models is None:
+                continue
+
+            for pipeline in pipelines:
+                # A bed still busy with its last tick skips this one rather than queueing behind it.
+                if pipeline.tick is None or pipeline.tick.done():
+                    pipeline.tick = pool.submit(pipeline.classify, models)
+
+def run_beds(night_context, beds, first_event_time):
+    """Multi-bed mode: a BedPipeline per bed in BEDS, fed by route_packets and classified on a shared pool."""
+    global bed_pipelines
+
+    pipelines = {}
+    for source, bed in beds.items():
+        if bed not in pipelines:
+            bed_context = replace(night_context, night_id=f"{night_context.night_id}-{bed}", bed=bed)
+            pipelines[bed] = BedPipeline(bed, bed_context, first_event_time)
+        bed_sources[source] = pipelines[bed]
+
+    bed_pipelines = list(pipelines.values())
+    for pipeline in bed_pipelines:
+        pipeline.start()
+    beds_ready.set()
+
+    # The alarm actions can take a while, so they run after the receiver starts delivering.
+    for pipeline in bed_pipelines:
+        pipeline.schedule()
+
+    threading.Thread(target=classify_beds, args=(bed_pipelines, night_context.until), name="classify", daemon=True).start()
+
+    while clock.now() < night_context.until:
+        clock.sleep(60)
+
+def report_latency(night_context, interval=LATENCY_SUMMARY_INTERVAL):
+    while clock.now() < night_context.until:
+        clock.sleep(interval)
 
+        write_latency_summary(night_context, interval)
+
+def write_latency_summary(night_context, interval=LATENCY_SUMMARY_INTERVAL):
+    # Each summary covers the interval since the previous one.
+    summary = stage_timings.summary(reset=True)
+    if not summary:
+        return
+
+    print(f"Stage latency over the last {interval // 60} minutes:")
+    print(format_summary(summary))
+    details = {"interval_seconds": interval, "stages": summary}
+    if bed_pipelines:
+        details["beds"] = {pipeline.bed: pipeline.summary() for pipeline in bed_pipelines}
+    else:
+        if pipeline_ready.is_set():
+            details["ingest"] = store_data.write_queue.stats()
+        if sequence_tracker.packets:
+            details["packets"] = sequence_tracker.report()
+
+    save_event_to_json(
+        "latency_summary",
+        clock.now(),
+        file_path=f"Data/{night_context.night_id}/sleep_events-{night_context.night_id}.json",
+        details=details
+    )
+
+def expected_threads():
+    threads = list(EXPECTED_THREADS)
+    if bed_pipelines:
+        threads.remove("store-data")
+        threads += [f"store-{pipeline.bed}" for pipeline in bed_pipelines]
+    return threads + (["alarm-scheduler"] if ALARM_BACKEND == "inprocess" else [])
+
+def collect_metrics():
+    # Reads counters and container lengths without taking any pipeline lock,
+    # so a scrape never holds up the receiver.
+    metrics = MetricsWriter()
+    now = time.monotonic()
+    packets = receiver_stats["packets"]
+    samples = receiver_stats["samples"]
+    classifications = classifier.classification_stats["count"] if classifier else 0
+
+    metrics.add("sleepautomation_received_packets_total", packets, "UDP data packets received", "counter")
+    metrics.add("sleepautomation_received_samples_total", samples, "ADC samples received", "counter")
+    metrics.add("sleepautomation_udp_socket_drops_total", udp_socket_drops(UDP_PORT), "Datagrams dropped by the kernel on the data socket", "counter")
+    metrics.add("sleepautomation_classifications_total", classifications, "Classifications made", "counter")
+    if sequence_tracker.packets:
+        metrics.add("sleepautomation_lost_packets_total", sequence_tracker.lost, "Packets missing from the sensor's sequence numbers", "counter")
+        metrics.add("sleepautomation_reordered_packets_total", sequence_tracker.reordered, "Packets that arrived after a later one", "counter")
+        metrics.add("sleepautomation_duplicate_packets_total", sequence_tracker.duplicates, "Duplicate packets discarded", "counter")
+
+    # Rates since the previous scrape.
+    if metrics_previous:
+        elapsed = now - metrics_previous["time"]
+        if elapsed > 0:
+            metrics.add("sleepautomation_packets_per_second", (packets - metrics_previous["packets"]) / elapsed, "Packets per second since the last scrape")
+            metrics.add("sleepautomation_samples_per_second", (samples - metrics_previous["samples"]) / elapsed, "Samples per second since the last scrape")
+            metrics.add("sleepautomation_classifications_per_second", (classifications - metrics_previous["classifications"]) / elapsed, "Classifications per second since the last scrape")
+    metrics_previous.update(time=now, packets=packets, samples=samples, classifications=classifications)
+
+    if pipeline_ready.is_set():
+        write_queue = store_data.write_queue
+        metrics.add("sleepautomation_write_queue_depth", len(write_queue), "Samples waiting to be written to the raw store")
+        metrics.add("sleepautomation_write_queue_capacity", write_queue.capacity, "write_queue capacity in samples")
+        metrics.add("sleepautomation_write_queue_high_water", write_queue.high_water, "Deepest write_queue so far")
+        metrics.add("sleepautomation_write_queue_spilled_samples", write_queue.spilled, "Samples currently spilled to disk")
+        metrics.add("sleepautomation_store_dropped_samples_total", write_queue.dropped, "Samples discarded because write_queue was full", "counter")
+        metrics.add("sleepautomation_write_queue_blocked_seconds_total", write_queue.blocked_seconds, "Time the receiver spent blocked on a full write_queue", "counter")
+        metrics.add("sleepautomation_live_buffer_fill_ratio", len(classifier.live_buffer.buffer) / classifier.live_buffer.max_len, "Fill of the 30 s classification buffer")
+
+        last_time = classifier.classification_stats["last_time"]
+        if last_time is not None:
+            metrics.add("sleepautomation_last_classification_age_seconds", clock.time() - last_time, "Seconds since the last classification")
+            metrics.add("sleepautomation_last_classification", 1, "Most recent raw classification", labels={"state": classifier.classification_stats["last_label"]})
+
+    for stage, summary in stage_timings.peek().items():
+        for quantile in ("p50", "p90", "p99"):
+            metrics.add(
+                "sleepautomation_stage_latency_seconds",
+                summary[quantile],
+                "Stage latency since the last latency summary",
+                labels={"stage": stage, "quantile": f"0.{quantile[1:]}"}
+            )
+
+    for pipeline in bed_pipelines:
+        labels = {"bed": pipeline.bed}
+        stats = pipeline.classifier_state.classification_stats
+        metrics.add("sleepautomation_bed_received_samples_total", pipeline.stats["samples"], "ADC samples received per bed", "counter", labels)
+        metrics.add("sleepautomation_bed_lost_packets_total", pipeline.sequence_tracker.lost, "Packets missing from each bed's sequence numbers", "counter", labels)
+        metrics.add("sleepautomation_bed_classifications_total", stats["count"], "Classifications made per bed", "counter", labels)
+        metrics.add("sleepautomation_bed_write_queue_depth", len(pipeline.write_queue), "Samples waiting to be written to each bed's raw store", labels=labels)
+        metrics.add("sleepautomation_bed_store_dropped_samples_total", pipeline.write_queue.dropped, "Samples discarded because a bed's write queue was full", "counter", labels)
+        if stats["last_time"] is not None:
+            metrics.add("sleepautomation_bed_last_classification_age_seconds", clock.time() - stats["last_time"], "Seconds since each bed's last classification", labels=labels)
+        metrics.add("sleepautomation_bed_asleep", int(pipeline.monitor.asleep), "1 once sleep onset is confirmed for the bed, 0 after a confirmed wake", labels=labels)
+
+    monitor = classification_monitor
+    if monitor is not None:
+        for state in STATES:
+            metrics.add("sleepautomation_smoothed_state", int(monitor.current_state == state), "Current smoothed sleep state", labels={"state": state})
+        metrics.add("sleepautomation_asleep", int(monitor.asleep), "1 once sleep onset is confirmed, 0 after a confirmed wake")
+
+    alive = {thread.name for thread in threading.enumerate() if thread.is_alive()}
+    for name in expected_threads():
+        metrics.add("sleepautomation_thread_alive", int(name in alive), "Worker thread liveness", labels={"thread": name})
+
+    metrics.add("sleepautomation_resident_memory_bytes", resident_memory_bytes(), "Resident set size")
+    metrics.add("sleepautomation_uptime_seconds", now - service_started, "Seconds since the service started")
+
+    return metrics.text()
+
+def metrics_health():
+    alive = {thread.name for thread in threading.enumerate() if thread.is_alive()}
+    missing = [name for name in expected_threads() if name not in alive]
+    if missing:
+        return False, f"threads not running: {', '.join(missing)}\n"
+    return True, "ok\n"
 
 if __name__ == "__main__":
     cutoff = dt_time(14, 00, 0, 0)
     today = datetime.now()
 
     night_context = build_night_context(cutoff, today)
+    beds = parse_beds(BEDS)
+    # Beds write to Data/<night>-<bed>/. An events file in the bare night
+    # folder would be summed as a single-bed night with 0 h slept, so the
+    # service's own events go elsewhere in multi-bed mode.
+    service_context = replace(night_context, night_id=f"{night_context.night_id}-{SERVICE_FOLDER}") if beds else night_context
+    service_events = f"Data/{service_context.night_id}/sleep_events-{service_context.night_id}.json"
+
+    with startup_timer.phase("bind_socket"):
+        sock = bind_receiver()
+
+    # Both receivers read from the start and hold packets until the pipeline that takes them exists.
+    if beds:
+        reciever_thread = threading.Thread(target=route_packets, args=(beds, night_context.until, sock), name="receiver", daemon=True)
+    else:
+        reciever_thread = threading.Thread(
+            target=reciever,
+            args=(night_context.until, night_context.night_id, sock),
+            name="receiver",
+            daemon=True
+        )
+    reciever_thread.start()
+    startup_timer.record("receiver_ready")
 
-    save_event_to_json(
-        "service_started",
-        datetime.now(),
-        file_path=f"Data/{night_context.night_id}/sleep_events-{night_context.night_id}.json"
-    )
+    save_event_to_json("service_started", datetime.now(), file_path=service_events)
+    tonight_sleep.load(service_events)
 
-    print(f"Running data collection and classification until {night_context.until} for night: {night_context.night_id}")
+    if METRICS_PORT:
+        start_metrics_server(collect_metrics, metrics_health, port=int(METRICS_PORT))
 
-    first_event_time = return_first_event_time(night_context.tomorrow.replace(hour=00, minute=00, second=0, microsecond=0))
-    night_state = NightState(first_event_time)
+    # `kill -USR1 <pid>` starts sampling; a second USR1 writes Data/<night>/profile-*.folded (Data/<night>-service/ with BEDS).
+    profiler = SamplingProfiler(f"Data/{service_context.night_id}")
+    signal.signal(signal.SIGUSR1, lambda signum, frame: profiler.toggle())
 
-    print(first_event_time)
+    print(f"Running data collection and classification until {night_context.until} for night: {night_context.night_id}")
 
-    sleep_onset_action(night_context, night_state, datetime.now())
+    load_pipeline_modules()
 
-    schedule_alarm(first_event_time.strftime("%H:%M:%S"), night_context=night_context, night_state=night_state)
+    if beds and ALARM_BACKEND != "inprocess":
+        # There is only one alarm.timer, so each bed's alarm has to be an in-process timer.
+        print(f"Multi-bed mode for {', '.join(sorted(set(beds.values())))}: using in-process alarm timers")
+        ALARM_BACKEND = "inprocess"
 
-    store_data.start_workers(night_context.night_id, night_context.until)
+    if ALARM_BACKEND == "inprocess":
+        get_alarm_timers()
 
-    classifier.start_workers(night_context.night_id, night_context.until)
+    if not beds:
+        # Restored before the workers start, so the first tick already sees the refilled buffer.
+        night_state = NightState(None)
+        monitor = ClassificationMonitor(night_context, night_state)
+        checkpointer = Checkpointer(night_context.night_id)
+        with startup_timer.phase("warm_start"):
+            resumed = warm_start(monitor, classifier.history_buffer, classifier.live_buffer, checkpointer)
 
-    reciever_thread = threading.Thread(
-        target=reciever,
-        args=(night_context.until,night_context.night_id),
+    with startup_timer.phase("start_workers"):
+        if beds:
+            threading.Thread(target=store_data.monitor_switch_events, args=(service_context.night_id, night_context.until), name="switch-monitor", daemon=True).start()
+            threading.Thread(target=classifier.watch_registry, args=(night_context.until,), name="registry-watcher", daemon=True).start()
+        else:
+            store_data.start_workers(night_context.night_id, night_context.until)
+            classifier.start_workers(night_context.night_id, night_context.until)
+
+    threading.Thread(target=report_startup, args=(service_context,), name="startup-report", daemon=True).start()
+    threading.Thread(target=report_latency, args=(service_context,), name="latency-report", daemon=True).start()
+
+    with startup_timer.phase("calendar"):
+        first_event_time = return_first_event_time(night_context.tomorrow.replace(hour=00, minute=00, second=0, microsecond=0))
+    if first_event_time is None:
+        log_error_to_json("No calendar data available, using default first event time", file_path=service_events)
+        first_event_time = datetime.strptime(DEFAULT_FIRST_EVENT_TIME, "%H:%M:%S").time()
+    threading.Thread(
+        target=get_calendar_service().run_prefetcher,
+        args=(night_context.until,),
+        name="calendar-prefetch",
         daemon=True
-    )
-    reciever_thread.start()
+    ).start()
+    print(first_event_time)
+
+    if beds:
+        try:
+            run_beds(night_context, beds, first_event_time)
+        except KeyboardInterrupt:
+            print("Stopping Service...")
+        sys.exit(0)
+
+    if night_state.get_first_event_time() is None:
+        night_state.set_first_event_time(first_event_time)
+
+    if resumed and night_state.get_alarm_scheduled() is not None:
+        # The alarm was already moved for tonight's sleep; recomputing it from now would move it blindly.
+        print(f"Resumed night with alarm at {night_state.get_alarm_scheduled()}")
+    else:
+        with startup_timer.phase("sleep_onset_action"):
+            sleep_onset_action(night_context, night_state, datetime.now())
+
+        with startup_timer.phase("schedule_alarm"):
+            schedule_alarm(first_event_time.strftime("%H:%M:%S"), night_context=night_context, night_state=night_state)
 
     try:
-        monitor_classification_history(night_context, night_state)
+        monitor_classification_history(night_context, night_state, monitor, checkpointer)
     except KeyboardInterrupt:
         print("Stopping Service...")
\ No newline at end of file
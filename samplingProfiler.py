@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import time
+import queue
+import threading
+from collections import Counter
+from datetime import datetime
+
+SAMPLE_INTERVAL = 0.02
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    """Samples every thread's stack from sys._current_frames() and writes collapsed stacks.
+
+    toggle() is safe to call from a signal handler, even re-entered by a
+    second signal: it only puts a request on a SimpleQueue, which takes
+    no lock. A control thread, idle on that queue, starts or stops the
+    sampler thread, and the sampler writes its own output file on the
+    way out. Output is one "thread;outer;...;inner count" line per
+    stack, as read by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, output_dir, interval=SAMPLE_INTERVAL):
+        self._lock = threading.Lock()
+        self._stop = None
+        self._requests = queue.SimpleQueue()
+        self.output_dir = output_dir
+        self.interval = interval
+        threading.Thread(target=self._control, name="profiler-control", daemon=True).start()
+
+    def running(self):
+        with self._lock:
+            return self._stop is not None
+
+    def toggle(self):
+        self._requests.put(None)
+
+    def _control(self):
+        while True:
+            self._requests.get()
+            with self._lock:
+                if self._stop is not None:
+                    self._stop.set()
+                    self._stop = None
+                else:
+                    self._stop = threading.Event()
+                    threading.Thread(target=self._run, args=(self._stop,), name="profiler", daemon=True).start()
+
+    def _run(self, stop):
+        print("Sampling profiler started")
+        own_ident = threading.get_ident()
+        stacks = Counter()
+        started = datetime.now()
+        start = time.perf_counter()
+        sampling_time = 0.0
+        samples = 0
+
+        while not stop.wait(self.interval):
+            sample_start = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                stacks[";".join(reversed(stack))] += 1
+
+            samples += 1
+            sampling_time += time.perf_counter() - sample_start
+
+        elapsed = time.perf_counter() - start
+        path = os.path.join(self.output_dir, f"profile-{started.strftime('%Y%m%d-%H%M%S')}.folded")
+        try:
+            self._write(stacks, path)
+        except OSError as e:
+            print(f"Error writing profile: {e}")
+            return
+
+        overhead = sampling_time / elapsed * 100 if elapsed else 0.0
+        print(f"Sampling profiler stopped: {samples} samples over {elapsed:.1f}s ({overhead:.1f}% overhead), written to {path}")
+
+    def _write(self, stacks, path):
+        os.makedirs(self.output_dir, exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        os.replace(temp_path, path)
@@ -0,0 +1,223 @@
+#!/usr/bin/python3
+
+import sys
+import time
+import socket
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+from processData import VOLTAGE_SCALE
+from packetFormat import build_packet
+
+HOST = "127.0.0.1"
+DATA_PORT = 5005
+SWITCH_PORT = 5006
+SAMPLE_RATE = 100
+SAMPLES_PER_PACKET = 12
+SWITCH_MESSAGES = ["notInBed", "Awake"]
+DRAIN_GRACE = 1.0
+MAX_DROP_RATE = 0.01
+
+def synthetic_night(start, hours=8.0, seed=0, sample_rate=SAMPLE_RATE):
+    """Breathing and heartbeat on a DC offset, restless for the first 20 minutes and briefly every 90 after."""
+    rng = np.random.default_rng(seed)
+    n = int(hours * 3600 * sample_rate)
+    t = np.arange(n) / sample_rate
+
+    voltages = 1.5 + 0.02 * np.sin(2 * np.pi * 0.25 * t) + 0.004 * np.sin(2 * np.pi * 1.1 * t)
+    voltages += rng.normal(0, 0.002, n)
+
+    restless = t < 20 * 60
+    restless |= (t % (90 * 60)) > (87 * 60)
+    voltages[restless] += rng.normal(0, 0.05, restless.sum())
+
+    return start.timestamp() + t, voltages
+
+def load_raw_voltages(night_id):
+    df = pd.read_csv(f"Data/{night_id}/raw_data-{night_id}.csv", parse_dates=['datetime'])
+    return df.sort_values('datetime')['voltage'].values
+
+def make_packets(voltages, samples_per_packet=SAMPLES_PER_PACKET):
+    """int16 little-endian packets, as sent by the sensor board."""
+    adc = np.clip(np.round(np.asarray(voltages) / VOLTAGE_SCALE), -32768, 32767).astype('<i2')
+    return [adc[i:i + samples_per_packet].tobytes() for i in range(0, len(adc), samples_per_packet)]
+
+def send_packets(packets, host=HOST, port=DATA_PORT, sample_rate=SAMPLE_RATE, samples_per_packet=SAMPLES_PER_PACKET, duration=None, burst=1, loss=0.0, seed=0, header=False, reorder=0.0, device_id=0):
+    """Send packets (looping if needed) at sample_rate, burst packets at a time; returns the send counts.
+
+    With header, each packet carries a sequence number, sample counter and
+    device_id; reorder is the fraction of packets held back and sent after
+    the next one.
+    """
+    rng = random.Random(seed)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    burst_interval = burst * samples_per_packet / sample_rate
+    if duration is None:
+        duration = len(packets) * samples_per_packet / sample_rate
+
+    stats = {"packets": 0, "samples": 0, "lost_packets": 0, "lost_samples": 0, "reordered_packets": 0, "late_bursts": 0}
+    start = time.monotonic()
+    index = 0
+    counter = 0
+    bursts = 0
+    held = None
+
+    try:
+        while time.monotonic() - start < duration:
+            for _ in range(burst):
+                samples = packets[index % len(packets)]
+                count = len(samples) // 2
+                packet = build_packet(index, counter, int(sample_rate), samples, device_id) if header else samples
+                index += 1
+                counter += count
+
+                # Simulated network loss: the packet is counted but never sent.
+                if rng.random() < loss:
+                    stats["lost_packets"] += 1
+                    stats["lost_samples"] += count
+                    continue
+
+                if held is None and rng.random() < reorder:
+                    held = (packet, count)
+                    stats["reordered_packets"] += 1
+                    continue
+
+                outgoing = [(packet, count)]
+                if held is not None:
+                    outgoing.append(held)
+                    held = None
+                for packet, count in outgoing:
+                    sock.sendto(packet, (host, port))
+                    stats["packets"] += 1
+                    stats["samples"] += count
+
+            bursts += 1
+            sleep_for = start + bursts * burst_interval - time.monotonic()
+            if sleep_for > 0:
+                time.sleep(sleep_for)
+            else:
+                stats["late_bursts"] += 1
+    finally:
+        sock.close()
+
+    stats["elapsed"] = time.monotonic() - start
+    return stats
+
+def send_switch_events(stop_event, host=HOST, port=SWITCH_PORT, interval=30.0):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    i = 0
+    while not stop_event.is_set():
+        sock.sendto(SWITCH_MESSAGES[i % len(SWITCH_MESSAGES)].encode("utf-8"), (host, port))
+        i += 1
+        stop_event.wait(interval)
+    sock.close()
+
+def start_receiver(port):
+    """Run runnerLive's receiver in this process on port so received samples can be counted."""
+    import runnerLive as runner
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(1.0)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 2*1024*1024)
+    sock.bind((HOST, port))
+
+    runner.load_pipeline_modules()
+    threading.Thread(target=runner.reciever, args=(None, None, sock), name="receiver", daemon=True).start()
+    return runner.receiver_stats
+
+def run_load(packets, rate, args, receiver_stats=None):
+    before = dict(receiver_stats) if receiver_stats is not None else None
+
+    sent = send_packets(
+        packets,
+        host=args.host,
+        port=args.port,
+        sample_rate=rate,
+        samples_per_packet=args.samples_per_packet,
+        duration=args.duration,
+        burst=args.burst,
+        loss=args.loss,
+        seed=args.seed,
+        header=args.header or bool(args.device_id),
+        reorder=args.reorder,
+        device_id=args.device_id
+    )
+
+    result = {"rate": rate, "sent": sent}
+    if receiver_stats is not None:
+        time.sleep(DRAIN_GRACE)
+        received = receiver_stats["samples"] - before["samples"]
+        result["received_samples"] = received
+        result["drop_rate"] = 1 - received / sent["samples"] if sent["samples"] else 0.0
+
+    return result
+
+def print_result(result):
+    sent = result["sent"]
+    line = (f"{result['rate']:>8.0f} samples/s target: sent {sent['samples']} samples in {sent['packets']} packets "
+            f"({sent['samples'] / sent['elapsed']:.0f}/s, {sent['lost_packets']} lost and {sent['reordered_packets']} reordered on purpose, "
+            f"{sent['late_bursts']} late bursts)")
+    if "received_samples" in result:
+        line += f", received {result['received_samples']} ({result['drop_rate'] * 100:.2f}% dropped)"
+    print(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in for the sensor board and in-bed switch")
+    parser.add_argument("--night", help="replay Data/<night>/raw_data-<night>.csv instead of a synthetic waveform")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=DATA_PORT)
+    parser.add_argument("--switch-port", type=int, default=SWITCH_PORT)
+    parser.add_argument("--switch-interval", type=float, default=0, help="send alternating switch messages this often (0 = never)")
+    parser.add_argument("--rate", type=float, default=SAMPLE_RATE, help="samples per second")
+    parser.add_argument("--samples-per-packet", type=int, default=SAMPLES_PER_PACKET)
+    parser.add_argument("--burst", type=int, default=1, help="packets sent back to back each time")
+    parser.add_argument("--loss", type=float, default=0.0, help="fraction of packets deliberately not sent")
+    parser.add_argument("--header", action="store_true", help="prefix packets with a sequence number and sample counter")
+    parser.add_argument("--device-id", type=int, default=0, help="device id sent in the header (implies --header)")
+    parser.add_argument("--reorder", type=float, default=0.0, help="fraction of packets deliberately sent after the next one")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--in-process", action="store_true", help="run runnerLive's receiver here and count what it receives")
+    parser.add_argument("--sweep", type=float, metavar="MAX_RATE", help="double the rate up to MAX_RATE to find the highest sustainable one (implies --in-process)")
+    args = parser.parse_args()
+
+    if args.night:
+        voltages = load_raw_voltages(args.night)
+    else:
+        # Enough synthetic signal for the longest run; packets loop if it runs out.
+        hours = max(args.duration * max(args.sweep or 0, args.rate) / SAMPLE_RATE / 3600, 0.05)
+        _, voltages = synthetic_night(datetime.now() - timedelta(hours=hours), hours, args.seed)
+    packets = make_packets(voltages, args.samples_per_packet)
+
+    receiver_stats = start_receiver(args.port) if args.in_process or args.sweep else None
+
+    stop_switch = threading.Event()
+    if args.switch_interval:
+        threading.Thread(target=send_switch_events, args=(stop_switch, args.host, args.switch_port, args.switch_interval), daemon=True).start()
+
+    try:
+        if args.sweep:
+            rate = args.rate
+            sustainable = None
+            while rate <= args.sweep:
+                result = run_load(packets, rate, args, receiver_stats)
+                print_result(result)
+                if result["drop_rate"] > MAX_DROP_RATE:
+                    break
+                sustainable = rate
+                rate *= 2
+            print(f"Highest sustainable rate: {sustainable:.0f} samples/s" if sustainable else "No sustainable rate found")
+        else:
+            print_result(run_load(packets, args.rate, args, receiver_stats))
+
+        if receiver_stats is not None and args.header:
+            import runnerLive as runner
+            print(f"Receiver packet report: {runner.sequence_tracker.report()}")
+    except KeyboardInterrupt:
+        sys.exit(0)
+    finally:
+        stop_switch.set()
@@ -0,0 +1,230 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import json
+import time
+import argparse
+import dataclasses
+from collections import Counter
+from datetime import datetime, timedelta, time as dt_time
+import numpy as np
+import pandas as pd
+
+import runnerLive as runner
+from virtualClock import VirtualClock
+from sleepCycles import SleepCycleTracker
+from sleepSummary import TonightSleep
+from sensorStandIn import synthetic_night
+from latencyStats import stage_timings, format_summary
+
+SAMPLE_RATE = 100
+SAMPLES_PER_PACKET = runner.PACKETS
+BATCH_THRESHOLD = 50 * runner.PACKETS
+CUTOFF = dt_time(14, 0, 0, 0)
+DEFAULT_FIRST_EVENT = "09:00:00"
+SIM_PREFIX = "sim"
+
+class InlineScheduler:
+    """Runs submitted actions straight away on the caller's thread, so alarm decisions are deterministic."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, action_type, target, args=(), kwargs=None, timeout=None):
+        self.submitted.append(action_type)
+        target(*args, **(kwargs or {}))
+
+class RecordingTimers:
+    """Stands in for the alarm/fade timers (systemd or in-process) and records every change."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.timers = {}
+        self.history = []
+
+    def schedule(self, name, when):
+        self.timers[name] = when
+        self.history.append({"at": self.clock.now(), "action": "schedule", "timer": name, "when": when})
+
+    def cancel(self, name):
+        self.timers.pop(name, None)
+        self.history.append({"at": self.clock.now(), "action": "cancel", "timer": name, "when": None})
+
+    def next_fire(self, name):
+        return self.timers.get(name)
+
+class FixedCalendar:
+    def __init__(self, first_event):
+        self.first_event = first_event
+
+    def get_events(self, date, block=True):
+        return [{"title": "Simulated event", "time": self.first_event, "location": "No Location", "notes": "No Notes"}]
+
+def load_raw_night(night_id):
+    """Unix timestamps and voltages from a stored raw_data file (naive UTC, as written by process_batch)."""
+    df = pd.read_csv(f"Data/{night_id}/raw_data-{night_id}.csv", parse_dates=['datetime'])
+    df = df.sort_values('datetime')
+    return df['datetime'].values.astype('datetime64[ns]').astype(np.int64) / 1e9, df['voltage'].values
+
+def to_adc(voltages, scale):
+    return np.clip(np.round(voltages / scale), -32768, 32767).astype(int)
+
+def read_events(night_id):
+    path = f"Data/{night_id}/sleep_events-{night_id}.json"
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+def simulate(times, voltages, source="synthetic", first_event=DEFAULT_FIRST_EVENT, models=None):
+    """Replay one night through the live pipeline on a virtual clock and return a report."""
+    if not runner.pipeline_ready.is_set():
+        runner.load_pipeline_modules()
+    classifier = runner.classifier
+    if models is None:
+        models = classifier.load_model_set()
+
+    start = datetime.fromtimestamp(times[0])
+    clock = VirtualClock(start)
+    timers = RecordingTimers(clock)
+    scheduler = InlineScheduler()
+    fades = []
+
+    night_context = runner.build_night_context(CUTOFF, start)
+    night_context = dataclasses.replace(night_context, night_id=SIM_PREFIX + night_context.night_id)
+    events_file = f"Data/{night_context.night_id}/sleep_events-{night_context.night_id}.json"
+    if os.path.exists(events_file):
+        os.remove(events_file)
+
+    patched = {
+        (runner, "clock"): clock,
+        (classifier, "clock"): clock,
+        (runner, "ALARM_BACKEND"): "inprocess",
+        (runner, "alarm_timers"): timers,
+        (runner, "action_scheduler"): scheduler,
+        (runner, "calendar_service"): FixedCalendar(datetime.strptime(first_event, "%H:%M:%S").time()),
+        (runner, "fire_fade_lights"): lambda **kwargs: fades.append({"at": clock.now(), **kwargs}),
+        (runner, "cycle_tracker"): SleepCycleTracker(),
+        (runner, "tonight_sleep"): TonightSleep(),
+        (classifier, "live_buffer"): classifier.RollingBuffer(window_seconds=30, sample_rate=SAMPLE_RATE),
+        (classifier, "history_buffer"): classifier.HistoryBuffer(max_length=12),
+        (classifier, "classification_channel"): classifier.ResultChannel(max_length=300),
+    }
+    originals = {key: getattr(*key) for key in patched}
+    for (module, name), value in patched.items():
+        setattr(module, name, value)
+
+    labels = Counter()
+    stage_times = Counter()
+    stage_timings.summary(reset=True)
+    wall_start = time.perf_counter()
+
+    try:
+        first_event_time = runner.return_first_event_time(night_context.tomorrow.replace(hour=0, minute=0, second=0, microsecond=0))
+        night_state = runner.NightState(first_event_time)
+        runner.sleep_onset_action(night_context, night_state, clock.now())
+        runner.schedule_alarm(first_event_time.strftime("%H:%M:%S"), night_context=night_context, night_state=night_state)
+
+        monitor = runner.ClassificationMonitor(night_context, night_state)
+        adc = to_adc(voltages, runner.data_processor.VOLTAGE_SCALE)
+        accumulator = []
+        next_tick = times[0] + classifier.ML_INTERVAL
+
+        for i in range(0, len(times), SAMPLES_PER_PACKET):
+            # A packet is stamped on arrival, i.e. with its last sample's time.
+            arrival = times[min(i + SAMPLES_PER_PACKET, len(times)) - 1]
+
+            while next_tick <= arrival:
+                clock.set(datetime.fromtimestamp(next_tick))
+
+                tick_start = time.perf_counter()
+                label = classifier.classify_tick(models)
+                stage_times["classify"] += time.perf_counter() - tick_start
+
+                if label is not None:
+                    labels[label] += 1
+                    tick_start = time.perf_counter()
+                    for result in classifier.classification_channel.drain(timeout=0):
+                        monitor.process(*result)
+                    stage_times["monitor"] += time.perf_counter() - tick_start
+
+                next_tick += classifier.ML_INTERVAL
+
+            clock.set(datetime.fromtimestamp(arrival))
+            timestamp = clock.time()
+            accumulator.extend((timestamp, int(value)) for value in adc[i:i + SAMPLES_PER_PACKET])
+
+            if len(accumulator) >= BATCH_THRESHOLD:
+                batch_start = time.perf_counter()
+                runner.process_accumulated(accumulator, night_context.night_id)
+                stage_times["process_batch"] += time.perf_counter() - batch_start
+    finally:
+        for (module, name), value in originals.items():
+            setattr(module, name, value)
+
+    wall_seconds = time.perf_counter() - wall_start
+    simulated_seconds = times[-1] - times[0]
+
+    return {
+        "source": source,
+        "night_id": night_context.night_id,
+        "model_version": models.version,
+        "samples": len(times),
+        "simulated_hours": round(simulated_seconds / 3600, 3),
+        "wall_seconds": round(wall_seconds, 3),
+        "speedup": round(simulated_seconds / wall_seconds, 1),
+        "stage_seconds": {stage: round(seconds, 3) for stage, seconds in stage_times.items()},
+        "classifications": dict(labels),
+        "events": read_events(night_context.night_id),
+        "timer_history": [
+            {key: value.strftime("%Y-%m-%d %H:%M:%S") if isinstance(value, datetime) else value for key, value in change.items()}
+            for change in timers.history
+        ],
+        "final_alarm": timers.timers["alarm"].strftime("%Y-%m-%d %H:%M:%S") if "alarm" in timers.timers else None,
+        "short_notice_fades": [dict(fade, at=fade["at"].strftime("%Y-%m-%d %H:%M:%S")) for fade in fades],
+        "actions": dict(Counter(scheduler.submitted)),
+        "latency": stage_timings.summary(reset=True),
+    }
+
+def print_report(report):
+    print(f"Replayed {report['simulated_hours']:.2f} h ({report['source']}, {report['samples']} samples) "
+          f"in {report['wall_seconds']:.1f} s: {report['speedup']:.0f}x real time")
+    for stage, seconds in report["stage_seconds"].items():
+        print(f"  {stage}: {seconds:.1f} s")
+    print("Stage latency (virtual time for ages, wall time for processing):")
+    print(format_summary(report["latency"]))
+    print(f"Classifications: {report['classifications']}")
+    for event in report["events"]:
+        print(f"  {event['timestamp']} {event['type']}")
+    print(f"Final alarm: {report['final_alarm']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a night through the live pipeline on a virtual clock")
+    parser.add_argument("night_id", nargs="?", help="replay Data/<night_id>/raw_data-<night_id>.csv")
+    parser.add_argument("--synthetic", type=float, metavar="HOURS", help="replay a synthetic night of this length instead")
+    parser.add_argument("--start", default="22:30", help="start time of a synthetic night (HH:MM, yesterday)")
+    parser.add_argument("--first-event", default=DEFAULT_FIRST_EVENT, help="time of tomorrow's first calendar event")
+    parser.add_argument("--report", help="write the report as JSON to this path")
+    parser.add_argument("--budget", type=float, help="exit non-zero if the replay takes longer than this many seconds")
+    args = parser.parse_args()
+
+    if args.night_id:
+        times, voltages = load_raw_night(args.night_id)
+        source = args.night_id
+    else:
+        start_time = datetime.strptime(args.start, "%H:%M").time()
+        start = datetime.combine(datetime.now().date() - timedelta(days=1), start_time)
+        times, voltages = synthetic_night(start, args.synthetic or 8.0)
+        source = "synthetic"
+
+    report = simulate(times, voltages, source=source, first_event=args.first_event)
+    print_report(report)
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=4)
+
+    if args.budget and report["wall_seconds"] > args.budget:
+        print(f"Replay took {report['wall_seconds']:.1f} s, over the {args.budget:.1f} s budget")
+        sys.exit(1)
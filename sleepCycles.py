@@ -0,0 +1,139 @@
+#!/usr/bin/python3
+
+import threading
+import statistics
+from datetime import timedelta
+from collections import deque
+
+CORE_WINDOW = 20        # minutes in the centred smoothing window
+PEAK_DISTANCE = 70      # minimum minutes between peaks
+PEAK_HEIGHT = 0.4       # 40% of the window was 'core'
+PEAK_PROMINENCE = 0.1   # peak must stand out relative to neighbours
+MIN_CYCLE = 70
+MAX_CYCLE = 120
+
+class SleepCycleTracker:
+    """Incremental replacement for resampling, smoothing and find_peaks over the whole night.
+
+    Minute states go in one at a time. The smoothed core-sleep signal lags
+    by half the window, and a peak is confirmed once the signal has dropped
+    PEAK_PROMINENCE below it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._minute = None
+        self._minute_value = 0
+        self._window = deque(maxlen=CORE_WINDOW)
+        self._window_sum = 0
+        self._smoothed = None
+        self._left_min = None
+        self._candidate = None
+        self._peaks = []
+        self._cycles = []
+        self._median_cycle = None
+
+    def add_state(self, timestamp, state):
+        minute = timestamp.replace(second=0, microsecond=0)
+        value = 1 if 'core' in str(state).lower() else 0
+
+        with self._lock:
+            if self._minute is None:
+                self._minute, self._minute_value = minute, value
+                return
+
+            if minute < self._minute:
+                return
+
+            if minute == self._minute:
+                self._minute_value = max(self._minute_value, value)
+                return
+
+            self._push(self._minute, self._minute_value)
+
+            gap_minute = self._minute + timedelta(minutes=1)
+            while gap_minute < minute:
+                self._push(gap_minute, 0)
+                gap_minute += timedelta(minutes=1)
+
+            self._minute, self._minute_value = minute, value
+
+    def _push(self, minute, value):
+        if len(self._window) == CORE_WINDOW:
+            self._window_sum -= self._window[0]
+        self._window.append(value)
+        self._window_sum += value
+
+        if len(self._window) == CORE_WINDOW:
+            centre = minute - timedelta(minutes=CORE_WINDOW - 1 - CORE_WINDOW // 2)
+            self._update_smoothed(centre, self._window_sum / CORE_WINDOW)
+
+    def _update_smoothed(self, minute, value):
+        self._smoothed = value
+
+        if self._candidate is None:
+            if self._left_min is None or value <= self._left_min:
+                self._left_min = value
+            else:
+                self._candidate = (minute, value)
+            return
+
+        peak_time, peak_value = self._candidate
+
+        if value > peak_value:
+            self._candidate = (minute, value)
+        elif peak_value - value >= PEAK_PROMINENCE:
+            if peak_value >= PEAK_HEIGHT and peak_value - self._left_min >= PEAK_PROMINENCE:
+                self._add_peak(peak_time, peak_value)
+            self._candidate = None
+            self._left_min = value
+
+    def _add_peak(self, peak_time, peak_value):
+        if self._peaks and peak_time - self._peaks[-1][0] < timedelta(minutes=PEAK_DISTANCE):
+            if peak_value <= self._peaks[-1][1]:
+                return
+            self._peaks[-1] = (peak_time, peak_value)
+        else:
+            self._peaks.append((peak_time, peak_value))
+
+        intervals = [
+            (later[0] - earlier[0]).total_seconds() / 60
+            for earlier, later in zip(self._peaks, self._peaks[1:])
+        ]
+        self._cycles = [interval for interval in intervals if MIN_CYCLE <= interval <= MAX_CYCLE]
+        self._median_cycle = statistics.median(self._cycles) if self._cycles else None
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: list(value) if isinstance(value, (deque, list)) else value
+                for name, value in vars(self).items() if name != "_lock"
+            }
+
+    def restore(self, snapshot):
+        with self._lock:
+            for name, value in snapshot.items():
+                setattr(self, name, value)
+            self._window = deque(snapshot["_window"], maxlen=CORE_WINDOW)
+
+    def has_history(self):
+        with self._lock:
+            return self._minute is not None
+
+    def smoothed_value(self):
+        with self._lock:
+            return self._smoothed
+
+    def peak_times(self):
+        with self._lock:
+            return [peak_time for peak_time, _ in self._peaks]
+
+    def median_cycle(self):
+        with self._lock:
+            return self._median_cycle
+
+    def next_predicted_peak(self):
+        with self._lock:
+            if self._median_cycle is None:
+                return None
+            return self._peaks[-1][0] + timedelta(minutes=self._median_cycle)
@@ -0,0 +1,139 @@
+#!/usr/bin/python3
+
+import os
+import json
+import threading
+from datetime import datetime, timedelta
+
+SUMMARY_CACHE_PATH = "Data/sleep_summaries.json"
+
+def events_path(night_id):
+    return f"Data/{night_id}/sleep_events-{night_id}.json"
+
+def load_events(json_path):
+    with open(json_path, 'r') as f:
+        events = json.load(f)
+
+    for e in events:
+        e["timestamp"] = datetime.strptime(e["timestamp"], "%Y-%m-%d %H:%M:%S")
+    events.sort(key=lambda x: x["timestamp"])
+    return events
+
+def sleep_periods(events):
+    periods = []
+    last_sleep_onset = None
+
+    for event in events:
+        if event["type"] == "sleep_onset":
+            last_sleep_onset = event["timestamp"]
+
+        elif event["type"] == "wake_up" and last_sleep_onset:
+            periods.append((last_sleep_onset, event["timestamp"]))
+            last_sleep_onset = None
+
+        elif event["type"] == "alarm_set":
+            if last_sleep_onset:
+                periods.append((last_sleep_onset, event["timestamp"]))
+                last_sleep_onset = None
+
+    return periods
+
+def calculate_sleep_time(json_path):
+    periods = sleep_periods(load_events(json_path))
+    total_sleep_seconds = sum((end - start).total_seconds() for start, end in periods)
+    return total_sleep_seconds / 3600
+
+class SleepSummaryCache:
+    """Hours slept per completed night, persisted to disk and recomputed only when a night's events file changes."""
+
+    def __init__(self, cache_path=SUMMARY_CACHE_PATH):
+        self._lock = threading.Lock()
+        self.cache_path = cache_path
+        self._summaries = {}
+        self._debts = {}
+
+        if os.path.isfile(cache_path):
+            try:
+                with open(cache_path) as f:
+                    self._summaries = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                self._summaries = {}
+
+    def night_hours(self, night_id):
+        json_path = events_path(night_id)
+        if not os.path.exists(json_path):
+            return None
+
+        mtime = os.path.getmtime(json_path)
+        with self._lock:
+            summary = self._summaries.get(night_id)
+            if summary is not None and summary["mtime"] == mtime:
+                return summary["hours"]
+
+        hours = calculate_sleep_time(json_path)
+
+        with self._lock:
+            self._summaries[night_id] = {"mtime": mtime, "hours": hours}
+            self._save()
+        return hours
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        temp_path = self.cache_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self._summaries, f, indent=4)
+        os.replace(temp_path, self.cache_path)
+
+    def past_hours(self, today, past_days=7, suffix=""):
+        # suffix picks one bed's nights in multi-bed mode, e.g. "-left".
+        night_ids = [(today - timedelta(days=i)).strftime("%d%m%y") + suffix for i in range(1, past_days + 1)]
+        return [hours for hours in map(self.night_hours, night_ids) if hours is not None]
+
+    def sleep_debt(self, today, hours_goal, past_days=7, suffix=""):
+        # Past nights are complete, so one lookup per night is enough for the whole service run.
+        key = (today.strftime("%d%m%y") + suffix, hours_goal, past_days)
+        with self._lock:
+            if key in self._debts:
+                return self._debts[key]
+
+        debt = sum(hours_goal - hours for hours in self.past_hours(today, past_days, suffix))
+
+        with self._lock:
+            self._debts[key] = debt
+        return debt
+
+class TonightSleep:
+    """Running total of tonight's sleep, fed the same events that are written to the night's JSON file."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._completed_seconds = 0.0
+        self._last_onset = None
+        self._alarm = None
+
+    def load(self, json_path):
+        if not os.path.exists(json_path):
+            return
+        for event in load_events(json_path):
+            self.record_event(event["type"], event["timestamp"])
+
+    def record_event(self, event_type, timestamp):
+        with self._lock:
+            if event_type == "sleep_onset":
+                self._last_onset = timestamp
+            elif event_type == "wake_up" and self._last_onset:
+                end = timestamp
+                if self._alarm and self._last_onset <= self._alarm < timestamp:
+                    end = self._alarm
+                self._completed_seconds += (end - self._last_onset).total_seconds()
+                self._last_onset = None
+            elif event_type == "alarm_set":
+                self._alarm = timestamp
+
+    def hours(self):
+        with self._lock:
+            total_seconds = self._completed_seconds
+            # An open sleep period runs until the alarm, as in calculate_sleep_time.
+            if self._last_onset and self._alarm and self._alarm >= self._last_onset:
+                total_seconds += (self._alarm - self._last_onset).total_seconds()
+            return total_seconds / 3600
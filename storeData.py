@@ -1,15 +1,17 @@
 #!/usr/bin/python3
 
+import io
 import socket
-import struct
 import time
 import os
 from datetime import datetime
 import threading
 from collections import deque
+import numpy as np
 import pandas as pd
 
 import processData as data_processor
+import packetFormat as packet_format
 
 DATE = "Awake"
 UDP_IP = "0.0.0.0"
@@ -19,9 +21,144 @@ BUFFER_SIZE = 4096
 PACKETS = 12
 ML_INTERVAL = 2.0
 STORE_CLASSIFICATION = False
+QUEUE_CAPACITY = 200000
+# "drop-oldest" (the old deque behaviour), "block" or "spill".
+INGEST_POLICY = os.environ.get("INGEST_POLICY", "drop-oldest")
+BLOCK_TIMEOUT = 0.5
+SPILL_CHUNK = 50000
+TAIL_BYTES = 256 * 1024
+GAP_MERGE_SECONDS = 1.0
+SPILL_RECORD = np.dtype([('timestamp', '<f8'), ('value', '<i2')])
 
-write_queue = deque(maxlen=200000)
-write_lock = threading.Lock()
+class IngestQueue:
+    """Bounded FIFO of (timestamp, adc) samples between the receiver and the raw store.
+
+    When full, the policy decides what happens: "drop-oldest" discards
+    the oldest samples, "block" makes the producer wait up to
+    BLOCK_TIMEOUT and then drops what still doesn't fit, and "spill"
+    appends to a file that drain() reads back once the queue is empty.
+    Dropped samples are counted and merged into gaps that the store
+    worker writes next to the raw data. Counters are plain attributes so
+    metrics can read them without the lock.
+    """
+
+    def __init__(self, capacity=QUEUE_CAPACITY, policy=INGEST_POLICY, spill_path=None, block_timeout=BLOCK_TIMEOUT):
+        if policy not in ("drop-oldest", "block", "spill"):
+            raise ValueError(f"Unknown ingest policy {policy}")
+
+        self._condition = threading.Condition()
+        self._queue = deque()
+        self._gaps = []
+        self._spill_file = None
+        self._spill_offset = 0
+        self.capacity = capacity
+        self.policy = policy
+        self.spill_path = spill_path
+        self.block_timeout = block_timeout
+
+        self.spilled = 0
+        self.dropped = 0
+        self.high_water = 0
+        self.blocked_seconds = 0.0
+
+    def __len__(self):
+        return len(self._queue) + self.spilled
+
+    def put(self, entries):
+        if not entries:
+            return
+
+        with self._condition:
+            if self.policy == "spill" and self.spill_path and (self.spilled or len(self._queue) + len(entries) > self.capacity):
+                # Once spilling, everything goes to the file until it is read back, to keep samples in order.
+                self._spill(entries)
+
+            elif self.policy == "block":
+                start = time.monotonic()
+                self._condition.wait_for(lambda: len(self._queue) + len(entries) <= self.capacity, timeout=self.block_timeout)
+                self.blocked_seconds += time.monotonic() - start
+
+                overflow = len(self._queue) + len(entries) - self.capacity
+                if overflow > 0:
+                    self._record_drop(entries[-overflow:])
+                    entries = entries[:-overflow]
+                self._queue.extend(entries)
+
+            else:
+                self._queue.extend(entries)
+                overflow = len(self._queue) - self.capacity
+                if overflow > 0:
+                    self._record_drop([self._queue.popleft() for _ in range(overflow)])
+
+            self.high_water = max(self.high_water, len(self))
+
+    def _record_drop(self, dropped):
+        self.dropped += len(dropped)
+        first, last = dropped[0][0], dropped[-1][0]
+
+        if self._gaps and first - self._gaps[-1]["end"] <= GAP_MERGE_SECONDS:
+            self._gaps[-1]["end"] = last
+            self._gaps[-1]["samples"] += len(dropped)
+        else:
+            self._gaps.append({"start": first, "end": last, "samples": len(dropped), "policy": self.policy})
+
+    def _spill(self, entries):
+        if self._spill_file is None:
+            os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+            self._spill_file = open(self.spill_path, "w+b")
+            self._spill_offset = 0
+
+        self._spill_file.seek(0, os.SEEK_END)
+        self._spill_file.write(np.array(entries, dtype=SPILL_RECORD).tobytes())
+        self.spilled += len(entries)
+
+    def _unspill(self, limit):
+        count = min(self.spilled, limit)
+        self._spill_file.flush()
+        self._spill_file.seek(self._spill_offset)
+        records = np.frombuffer(self._spill_file.read(count * SPILL_RECORD.itemsize), dtype=SPILL_RECORD)
+
+        self._spill_offset += count * SPILL_RECORD.itemsize
+        self.spilled -= count
+        if self.spilled == 0:
+            self._spill_file.close()
+            self._spill_file = None
+            os.remove(self.spill_path)
+
+        return list(zip(records['timestamp'].tolist(), records['value'].tolist()))
+
+    def drain(self, spill_chunk=SPILL_CHUNK):
+        """Everything queued in memory, or, once that is empty, the next chunk of spilled samples."""
+        with self._condition:
+            if self._queue:
+                batch = list(self._queue)
+                self._queue.clear()
+            elif self.spilled:
+                batch = self._unspill(spill_chunk)
+            else:
+                batch = []
+
+            self._condition.notify_all()
+            return batch
+
+    def take_gaps(self):
+        with self._condition:
+            gaps = self._gaps
+            self._gaps = []
+            return gaps
+
+    def stats(self):
+        return {
+            "policy": self.policy,
+            "capacity": self.capacity,
+            "depth": len(self),
+            "high_water": self.high_water,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "blocked_seconds": round(self.blocked_seconds, 3)
+        }
+
+write_queue = IngestQueue()
 
 class RollingBuffer:
     def __init__(self, window_seconds, sample_rate):
@@ -51,16 +188,20 @@ class RollingBuffer:
 #Create Buffer Instance
 live_buffer = RollingBuffer(window_seconds=30, sample_rate=100)
 
-def store_data(date, until=None):
+def store_data(date, until=None, queue=None):
+    # Multi-bed mode gives each bed its own queue and night folder.
+    if queue is None:
+        queue = write_queue
+
     print("Processing worker started")
     accumulator = []
 
     while until is None or datetime.now() < until:
-        new_data_batch = []
-        with write_lock:
-            if write_queue:
-                new_data_batch = list(write_queue)
-                write_queue.clear()
+        new_data_batch = queue.drain()
+
+        gaps = queue.take_gaps()
+        if gaps:
+            write_gaps(date, gaps)
 
         if new_data_batch:
             accumulator.extend(new_data_batch)
@@ -68,27 +209,68 @@ def store_data(date, until=None):
         if len(accumulator) >= (50 * PACKETS):
             batch = list(accumulator)
             accumulator.clear()
+            store_batch(date, batch)
 
-            try:
-                processed_df = data_processor.process_batch(batch)
-        
-                if processed_df is not None and not processed_df.empty:
-                    live_buffer.add_batch(processed_df)
+        elif not new_data_batch:
+            time.sleep(0.01)
 
-                    file_exists = os.path.isfile(f"Data/{date}/raw_data-{date}.csv")
+def store_batch(date, batch):
+    """Resample one batch of raw samples and append it to raw_data-<date>.csv."""
+    try:
+        processed_df = data_processor.process_batch(batch)
 
-                    processed_df.to_csv(
-                        f"Data/{date}/raw_data-{date}.csv", 
-                        mode='a', 
-                        header=not file_exists, 
-                        index=False
-                    )
+        if processed_df is not None and not processed_df.empty:
+            live_buffer.add_batch(processed_df)
 
-            except Exception as e:
-                print(f"Error in processing: {e}")
+            file_exists = os.path.isfile(f"Data/{date}/raw_data-{date}.csv")
 
-        elif not new_data_batch:
-            time.sleep(0.01)
+            processed_df.to_csv(
+                f"Data/{date}/raw_data-{date}.csv", 
+                mode='a', 
+                header=not file_exists, 
+                index=False
+            )
+
+    except Exception as e:
+        print(f"Error in processing: {e}")
+
+def read_raw_tail(date, rows, chunk_bytes=TAIL_BYTES):
+    """The last rows of raw_data-<date>.csv, read from the end of the file rather than parsing the whole night."""
+    file_path = f"Data/{date}/raw_data-{date}.csv"
+    if not os.path.isfile(file_path):
+        return None
+
+    with open(file_path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - chunk_bytes))
+        tail = f.read()
+
+    # Drop the partial first line (or the header) and whatever follows the last newline: empty, or a write in progress.
+    lines = tail.split(b"\n")[1:-1]
+    if not lines:
+        return None
+
+    df = pd.read_csv(io.BytesIO(b"\n".join(lines[-rows:])), names=['datetime', 'voltage'])
+    df['datetime'] = pd.to_datetime(df['datetime'], errors='coerce')
+    df['voltage'] = pd.to_numeric(df['voltage'], errors='coerce')
+    return df.dropna().reset_index(drop=True)
+
+def write_gaps(date, gaps):
+    """Record dropped stretches in gaps-<date>.csv, with times in the raw store's format."""
+    print(f"Ingest queue dropped {sum(gap['samples'] for gap in gaps)} samples")
+    file_path = f"Data/{date}/gaps-{date}.csv"
+    file_exists = os.path.isfile(file_path)
+
+    df_gaps = pd.DataFrame(gaps)
+    df_gaps['start'] = pd.to_datetime(df_gaps['start'], unit='s')
+    df_gaps['end'] = pd.to_datetime(df_gaps['end'], unit='s')
+
+    df_gaps.to_csv(
+        file_path,
+        mode='a',
+        header=not file_exists,
+        index=False
+    )
 
 def monitor_switch_events(date, until=None):
     print(f"Switch Monitor worker started on port {UDP_PORT_STATE}")
@@ -107,52 +289,49 @@ def monitor_switch_events(date, until=None):
             data, addr = sock_switch.recvfrom(1024)
             message = data.decode('utf-8').strip()
             timestamp = time.time()
-            readable_time = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S.%f')
 
             if message != prev:
                 prev = message
             
                 print(f"Switch Event Received: {message} from {addr}")
-                
-                file_path = f"{dir_path}/inbed_data-{date}.csv"
-                file_exists = os.path.isfile(file_path)
-                
-                df_switch = pd.DataFrame([{
-                    'datetime': readable_time,
-                    'sleep_state': message
-                }])
-                
-                df_switch.to_csv(
-                    file_path,
-                    mode='a',
-                    header=not file_exists,
-                    index=False
-                )
+                write_switch_event(date, message, timestamp)
             
         except Exception as e:
             print(f"Error in switch monitor: {e}")
 
+def write_switch_event(date, message, timestamp):
+    readable_time = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S.%f')
+    file_path = f"Data/{date}/inbed_data-{date}.csv"
+    file_exists = os.path.isfile(file_path)
+    
+    df_switch = pd.DataFrame([{
+        'datetime': readable_time,
+        'sleep_state': message
+    }])
+    
+    df_switch.to_csv(
+        file_path,
+        mode='a',
+        header=not file_exists,
+        index=False
+    )
+
 def parse_packet(data):
-    remainder = len(data) % 2
-    if remainder != 0:
-        data = data[:-remainder] 
-        
-    count = len(data) // 2
-    if count == 0:
-        return []
-        
-    return struct.unpack(f'<{count}h', data)
+    # Standalone mode stamps samples on arrival, so any header is just skipped.
+    return packet_format.parse_packet(data)[1]
 
 def start_workers(date, until=None):
     if not os.path.exists(f"Data/{date}"):
         os.makedirs(f"Data/{date}")
 
+    write_queue.spill_path = f"Data/{date}/spill-{date}.bin"
+
     args = (date, until)
     
-    data_thread = threading.Thread(target=store_data, args=args, daemon=True)
+    data_thread = threading.Thread(target=store_data, args=args, name="store-data", daemon=True)
     data_thread.start()
 
-    switch_thread = threading.Thread(target=monitor_switch_events, args=args, daemon=True)
+    switch_thread = threading.Thread(target=monitor_switch_events, args=args, name="switch-monitor", daemon=True)
     switch_thread.start()
 
 def run(date, until=None):
@@ -183,8 +362,7 @@ def run(date, until=None):
                 
                 new_entries = [(timestamp, val) for val in adc_values]
 
-                with write_lock:
-                    write_queue.extend(new_entries)
+                write_queue.put(new_entries)
                 
             except socket.timeout:
                 if not first_packet: print("No data...")
@@ -8,11 +8,135 @@ from sklearn.metrics import accuracy_score, classification_report, confusion_mat
 import matplotlib.pyplot as plt
 import seaborn as sns
 import joblib
-import os
+import json
+import pickle
+import time
+
+import modelRegistry as model_registry
 
 PATH = "ML/"
+REGISTRY_PATH = PATH + "registry/"
+
+ML_INTERVAL = 2.0
+INFERENCE_HEADROOM = 0.25
+LATENCY_BUDGET = ML_INTERVAL * INFERENCE_HEADROOM / 3
+MEMORY_BUDGET = 16 * 1024 * 1024
+LIVE_ROWS = 13
+TIMING_REPEATS = 25
+
+SEARCH_GRID = [
+    {'n_estimators': n_estimators, 'max_depth': max_depth, 'min_samples_leaf': min_samples_leaf}
+    for n_estimators in (25, 50, 100)
+    for max_depth in (8, 16, None)
+    for min_samples_leaf in (1, 5)
+]
+
+def measure_inference_time(model, X_sample, repeats=TIMING_REPEATS):
+    """Median wall time of one live-sized predict call, run single-threaded as on the Pi."""
+    model.n_jobs = 1
+    rows = X_sample.iloc[:LIVE_ROWS]
+    model.predict(rows)
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict(rows)
+        timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    per_call = timings[len(timings) // 2]
+    return per_call, per_call / len(rows)
+
+def model_size(model):
+    return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+
+def pareto_front(candidates):
+    front = []
+    best_accuracy = -1.0
+    for candidate in sorted(candidates, key=lambda c: (c['inference_seconds_per_call'], -c['accuracy'])):
+        if candidate['accuracy'] > best_accuracy:
+            front.append(candidate)
+            best_accuracy = candidate['accuracy']
+    return front
+
+def fit_within_budget(X, y, latency_budget=None, memory_budget=None, evaluate=True):
+    if latency_budget is None:
+        latency_budget = LATENCY_BUDGET
+    if memory_budget is None:
+        memory_budget = MEMORY_BUDGET
+
+    X_fit, X_val, y_fit, y_val = train_test_split(
+        X, y,
+        test_size=0.25,
+        random_state=42,
+        stratify=y
+    )
+
+    candidates = []
+    for params in SEARCH_GRID:
+        model = RandomForestClassifier(random_state=42, n_jobs=-1, verbose=0, **params)
+        model.fit(X_fit, y_fit)
+        accuracy = accuracy_score(y_val, model.predict(X_val))
+        per_call, per_row = measure_inference_time(model, X_val)
+        candidates.append({
+            'params': params,
+            'accuracy': accuracy,
+            'inference_seconds_per_call': per_call,
+            'inference_seconds_per_row': per_row,
+            'size_bytes': model_size(model)
+        })
+
+    front = pareto_front(candidates)
+    within_budget = [
+        c for c in candidates
+        if c['inference_seconds_per_call'] <= latency_budget and c['size_bytes'] <= memory_budget
+    ]
+
+    if evaluate:
+        print("\nAccuracy/Latency Pareto Front:")
+        for c in front:
+            marker = "*" if c in within_budget else " "
+            print(f" {marker} {c['params']}: accuracy {c['accuracy'] * 100:.2f}%, "
+                  f"{c['inference_seconds_per_call'] * 1000:.2f} ms/call, "
+                  f"{c['inference_seconds_per_row'] * 1e6:.1f} us/row, "
+                  f"{c['size_bytes'] / 1024 / 1024:.2f} MB")
+
+    if not within_budget:
+        raise RuntimeError(
+            f"No model configuration meets the budget of {latency_budget * 1000:.1f} ms/call "
+            f"and {memory_budget / 1024 / 1024:.1f} MB"
+        )
 
-def train_inbed(df, path, evaluate=True, plot_cm=False):
+    chosen = max(within_budget, key=lambda c: (c['accuracy'], -c['inference_seconds_per_call']))
+
+    model = RandomForestClassifier(random_state=42, n_jobs=-1, verbose=0, **chosen['params'])
+    model.fit(X, y)
+    per_call, per_row = measure_inference_time(model, X)
+
+    report = {
+        'params': chosen['params'],
+        'validation_accuracy': chosen['accuracy'],
+        'inference_seconds_per_call': per_call,
+        'inference_seconds_per_row': per_row,
+        'size_bytes': model_size(model),
+        'latency_budget': latency_budget,
+        'memory_budget': memory_budget,
+        'pareto_front': front
+    }
+
+    if evaluate:
+        print(f"\nChosen {chosen['params']}: {per_call * 1000:.2f} ms/call, {per_row * 1e6:.1f} us/row")
+
+    return model, report
+
+def save_model(model, le, path, name, features, report):
+    joblib.dump(model, path + f'{name}_model.joblib')
+    joblib.dump(le, path + f'{name}_encoder.joblib')
+
+    with open(path + f'{name}_meta.json', "w") as f:
+        json.dump(dict(report, features=list(features)), f, indent=4, default=str)
+
+def train_inbed(df, path, evaluate=True, plot_cm=False, latency_budget=None, memory_budget=None):
 
     df = df.dropna().copy()
 
@@ -53,29 +177,21 @@ def train_inbed(df, path, evaluate=True, plot_cm=False):
         stratify=y_encoded
     )
 
-    model = RandomForestClassifier(
-        n_estimators=100, 
-        random_state=42, 
-        n_jobs=-1,
-        verbose=0
+    model, search_report = fit_within_budget(
+        X_train, y_train,
+        latency_budget=latency_budget,
+        memory_budget=memory_budget,
+        evaluate=evaluate
     )
 
-    model.fit(X_train, y_train)
-
-    model_filename = path + 'in_bed_model.joblib'
-    encoder_filename = path + 'in_bed_encoder.joblib'
-
-    joblib.dump(model, path + "temp_model.joblib")
-    joblib.dump(le, path + "temp_encoder.joblib")
-
-    os.replace(path + "temp_model.joblib", model_filename)
-    os.replace(path + "temp_encoder.joblib", encoder_filename)
-
     #Evaluation:
     y_pred = model.predict(X_test)
 
     accuracy = accuracy_score(y_test, y_pred)
 
+    search_report['test_accuracy'] = accuracy
+    save_model(model, le, path, 'in_bed', features, search_report)
+
     if evaluate:
         print(f"\nOverall Accuracy: {accuracy * 100:.2f}%")
 
@@ -108,7 +224,7 @@ def train_inbed(df, path, evaluate=True, plot_cm=False):
 
     return model, accuracy, cm
 
-def train_asleep(df, path, evaluate=True, plot_cm=False):
+def train_asleep(df, path, evaluate=True, plot_cm=False, latency_budget=None, memory_budget=None):
 
     df = df.dropna()
 
@@ -155,29 +271,21 @@ def train_asleep(df, path, evaluate=True, plot_cm=False):
         stratify=y_encoded
     )
 
-    model = RandomForestClassifier(
-        n_estimators=100, 
-        random_state=42, 
-        n_jobs=-1,
-        verbose=0
+    model, search_report = fit_within_budget(
+        X_train, y_train,
+        latency_budget=latency_budget,
+        memory_budget=memory_budget,
+        evaluate=evaluate
     )
 
-    model.fit(X_train, y_train)
-
-    model_filename = path + 'asleep_model.joblib'
-    encoder_filename = path + 'asleep_encoder.joblib'
-
-    joblib.dump(model, path + "temp_model.joblib")
-    joblib.dump(le, path + "temp_encoder.joblib")
-
-    os.replace(path + "temp_model.joblib", model_filename)
-    os.replace(path + "temp_encoder.joblib", encoder_filename)
-
     #Evaluation:
     y_pred = model.predict(X_test)
 
     accuracy = accuracy_score(y_test, y_pred)
 
+    search_report['test_accuracy'] = accuracy
+    save_model(model, le, path, 'asleep', features, search_report)
+
     if evaluate:
         print(f"\nOverall Accuracy: {accuracy * 100:.2f}%")
 
@@ -209,7 +317,7 @@ def train_asleep(df, path, evaluate=True, plot_cm=False):
 
     return model, accuracy, cm
 
-def train_state(df, path, evaluate=True, plot_cm=False):
+def train_state(df, path, evaluate=True, plot_cm=False, latency_budget=None, memory_budget=None):
 
     df = df.dropna()
 
@@ -248,29 +356,21 @@ def train_state(df, path, evaluate=True, plot_cm=False):
         stratify=y_encoded
     )
 
-    model = RandomForestClassifier(
-        n_estimators=100, 
-        random_state=42, 
-        n_jobs=-1,
-        verbose=0
+    model, search_report = fit_within_budget(
+        X_train, y_train,
+        latency_budget=latency_budget,
+        memory_budget=memory_budget,
+        evaluate=evaluate
     )
 
-    model.fit(X_train, y_train)
-
-    model_filename = path + 'state_model.joblib'
-    encoder_filename = path + 'state_encoder.joblib'
-
-    joblib.dump(model, path + "temp_model.joblib")
-    joblib.dump(le, path + "temp_encoder.joblib")
-
-    os.replace(path + "temp_model.joblib", model_filename)
-    os.replace(path + "temp_encoder.joblib", encoder_filename)
-
     #Evaluation:
     y_pred = model.predict(X_test)
 
     accuracy = accuracy_score(y_test, y_pred)
 
+    search_report['test_accuracy'] = accuracy
+    save_model(model, le, path, 'state', features, search_report)
+
     if evaluate:
         print(f"\nOverall Accuracy: {accuracy * 100:.2f}%")
 
@@ -305,15 +405,31 @@ def train_state(df, path, evaluate=True, plot_cm=False):
 
 df_default = pd.read_csv('Data/all_nights_formatted_data.csv')
 
-def train_all_models(df=df_default, path=PATH):
-    
-    IBmodel, IBaccuracy, IBcm = train_inbed(df, path)
-    ASmodel, ASaccuracy, AScm = train_asleep(df, path)
-    STmodel, STaccuracy, STcm = train_state(df, path)
+def train_all_models(df=df_default, registry_path=REGISTRY_PATH, latency_budget=LATENCY_BUDGET, memory_budget=MEMORY_BUDGET):
+
+    path = model_registry.begin_version(registry_path)
+
+    try:
+        IBmodel, IBaccuracy, IBcm = train_inbed(df, path, latency_budget=latency_budget, memory_budget=memory_budget)
+        ASmodel, ASaccuracy, AScm = train_asleep(df, path, latency_budget=latency_budget, memory_budget=memory_budget)
+        STmodel, STaccuracy, STcm = train_state(df, path, latency_budget=latency_budget, memory_budget=memory_budget)
+    except Exception:
+        model_registry.discard_staging(path)
+        raise
+
+    version = model_registry.commit_version(path, registry_path)
+    print(f"\nRegistered model version {version}")
 
     print(f"\nIn-Bed Model Accuracy: {IBaccuracy * 100:.2f}%")
     print(f"Asleep Model Accuracy: {ASaccuracy * 100:.2f}%")
     print(f"State Model Accuracy: {STaccuracy * 100:.2f}%")
 
+    cascade_latency = sum(
+        measure_inference_time(model, df[list(model.feature_names_in_)].dropna())[0]
+        for model in (IBmodel, ASmodel, STmodel)
+    )
+    print(f"Cascade Inference: {cascade_latency * 1000:.2f} ms per tick "
+          f"({cascade_latency / ML_INTERVAL * 100:.1f}% of ML_INTERVAL)")
+
 if __name__ == "__main__":
     train_all_models()
\ No newline at end of file
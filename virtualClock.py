@@ -0,0 +1,45 @@
+#!/usr/bin/python3
+
+import time
+import threading
+from datetime import datetime, timedelta
+
+class SystemClock:
+    def now(self):
+        return datetime.now()
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+class VirtualClock:
+    """Clock that only moves when told to; sleep() advances it instead of blocking.
+
+    Used by the night simulation so the pipeline's time checks and event
+    timestamps follow the replayed data rather than the wall clock.
+    """
+
+    def __init__(self, start):
+        self._lock = threading.Lock()
+        self._now = start
+
+    def now(self):
+        with self._lock:
+            return self._now
+
+    def time(self):
+        return self.now().timestamp()
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        with self._lock:
+            self._now += timedelta(seconds=seconds)
+
+    def set(self, when):
+        with self._lock:
+            if when > self._now:
+                self._now = when